@@ -32,6 +32,7 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # ======================================
 from routes.home import router as home_router
 from routes.voice import router as voice_router
+from routes.voice_stream import router as voice_stream_router
 from routes.static_files import router as static_router
 from routes.system import router as system_router
 
@@ -47,6 +48,7 @@ from utils.admin_dashboard import router as admin_router
 # ======================================
 app.include_router(home_router)
 app.include_router(voice_router)
+app.include_router(voice_stream_router)
 app.include_router(static_router)
 app.include_router(system_router)
 
@@ -58,3 +60,17 @@ app.include_router(profile_router)
 app.include_router(supabase_router)
 app.include_router(upgrade_router)
 app.include_router(admin_router)
+
+# ======================================
+# Startup
+# ======================================
+import asyncio
+from utils.stt_backends import get_stt_backend
+from utils.audio_store import audio_store
+
+@app.on_event("startup")
+async def startup():
+    # Load the default STT engine once per process (no-op for the API backend)
+    get_stt_backend().warmup()
+    # Expire / evict old reply clips in the background
+    app.state.audio_sweeper = asyncio.create_task(audio_store.run_sweeper())
@@ -0,0 +1,116 @@
+# rag/chunk_store.py
+"""
+Memory-mapped chunk store, addressed by FAISS vector ID.
+
+Two files live next to the index:
+  <name>.chunks   UTF-8 text and JSON metadata of every chunk, back to back
+  <name>.idx      .npy table; row `id` holds the byte spans of chunk `id`
+
+Both are memory-mapped, so opening the store costs the same for ten
+chunks or a million, only the pages of chunks actually returned are ever
+read, and every worker process shares one copy in the page cache.
+Lookups are O(1): one row read plus one slice.
+"""
+
+import os
+import json
+import mmap
+from pathlib import Path
+
+import numpy as np
+
+SPAN_DTYPE = np.dtype([
+    ("text_offset", "<u8"),
+    ("text_length", "<u4"),
+    ("meta_offset", "<u8"),
+    ("meta_length", "<u4"),
+])
+
+METADATA_FIELDS = ("source", "country", "visa_type", "language")
+
+
+def store_paths(index_path) -> tuple[Path, Path]:
+    """(data, offsets) files that belong to a FAISS index file."""
+    index_path = Path(index_path)
+    return index_path.with_suffix(".chunks"), index_path.with_suffix(".idx")
+
+
+def write_chunk_store(index_path, chunks: dict[int, tuple[str, dict]]):
+    """
+    Write {id: (text, metadata)} next to `index_path`.
+    Both files are written to temp names and swapped in with os.replace;
+    the offsets table records the data size so a reader can tell if it
+    caught the pair mid-swap.
+    """
+    data_path, idx_path = store_paths(index_path)
+    size = (max(chunks) + 1) if chunks else 0
+    spans = np.zeros(size + 1, dtype=SPAN_DTYPE)  # last row: data file size
+
+    data_tmp = data_path.with_name(data_path.name + ".tmp")
+    offset = 0
+    with open(data_tmp, "wb") as f:
+        for chunk_id in sorted(chunks):
+            text, meta = chunks[chunk_id]
+            text_bytes = text.encode("utf-8")
+            meta_bytes = json.dumps(
+                {k: meta.get(k) for k in METADATA_FIELDS}, ensure_ascii=False
+            ).encode("utf-8")
+            spans[chunk_id] = (offset, len(text_bytes), offset + len(text_bytes), len(meta_bytes))
+            f.write(text_bytes)
+            f.write(meta_bytes)
+            offset += len(text_bytes) + len(meta_bytes)
+    spans[size] = (offset, 0, 0, 0)
+
+    idx_tmp = idx_path.with_name(idx_path.name + ".tmp")
+    with open(idx_tmp, "wb") as f:
+        np.save(f, spans)
+
+    os.replace(data_tmp, data_path)
+    os.replace(idx_tmp, idx_path)
+
+
+class ChunkStore:
+    def __init__(self, index_path):
+        data_path, idx_path = store_paths(index_path)
+        self._spans = np.load(idx_path, mmap_mode="r")
+        expected = int(self._spans[-1]["text_offset"]) if len(self._spans) else 0
+
+        self._file = open(data_path, "rb")
+        actual = os.fstat(self._file.fileno()).st_size
+        if actual != expected:
+            self._file.close()
+            raise ValueError(f"Chunk store mismatch: {data_path} is {actual} bytes, offsets expect {expected}")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if actual else b""
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._spans["text_length"][:-1]))
+
+    def ids(self) -> np.ndarray:
+        """IDs of every stored chunk, ascending."""
+        return np.flatnonzero(self._spans["text_length"][:-1])
+
+    def _span(self, chunk_id: int):
+        chunk_id = int(chunk_id)
+        if chunk_id < 0 or chunk_id >= len(self._spans) - 1:
+            return None
+        span = self._spans[chunk_id]
+        return span if span["text_length"] else None
+
+    def get(self, chunk_id: int) -> str | None:
+        span = self._span(chunk_id)
+        if span is None:
+            return None
+        start = int(span["text_offset"])
+        return self._data[start:start + int(span["text_length"])].decode("utf-8")
+
+    def metadata(self, chunk_id: int) -> dict | None:
+        span = self._span(chunk_id)
+        if span is None:
+            return None
+        start = int(span["meta_offset"])
+        return json.loads(self._data[start:start + int(span["meta_length"])])
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
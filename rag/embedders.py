@@ -0,0 +1,293 @@
+# rag/embedders.py
+"""
+Pluggable embedding engines, shared by the index builder and the retriever.
+
+  • openai : remote `text-embedding-3-*` (default)
+  • onnx   : in-process multilingual sentence encoder on CPU (onnxruntime +
+             tokenizers), English and Persian, no network
+  • hash   : deterministic hashed bag-of-words vectors — no model, no
+             network; a stand-in for benchmarks (scripts/benchmark_retrieval.py)
+
+The builder embeds with NIKA_EMBED_BACKEND and records the embedder's
+`model` id in the build manifest ("text-embedding-3-small",
+"onnx:multilingual-e5-small", ...). The retriever resolves the same id
+back to an embedder with `get_embedder(manifest["model"])`, so queries
+are always embedded like the index they search.
+
+An ONNX model directory holds `model.onnx` (or `onnx/model.onnx`) and
+`tokenizer.json`, e.g. an export of intfloat/multilingual-e5-small:
+    optimum-cli export onnx --model intfloat/multilingual-e5-small models/multilingual-e5-small
+Concurrent query embeddings are micro-batched: requests arriving within
+NIKA_EMBED_MICROBATCH_MS of each other share one forward pass.
+"""
+
+import os
+import zlib
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from rag.embedding_cache import EmbeddingCache, text_hash
+from utils.batching import MicroBatcher
+
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MODELS_DIR = PROJECT_ROOT / "models"
+
+EMBED_BACKEND = os.getenv("NIKA_EMBED_BACKEND", "openai").lower()
+EMBED_MODEL = os.getenv("NIKA_EMBED_MODEL", "text-embedding-3-small")
+# Matryoshka truncation for text-embedding-3-* (e.g. 256 / 512 / 1024); 0 = model default
+EMBED_DIMENSIONS = int(os.getenv("NIKA_EMBED_DIMENSIONS", "0")) or None
+
+# Name under models/ or a path to the exported model directory
+ONNX_MODEL = os.getenv("NIKA_ONNX_MODEL", "multilingual-e5-small")
+# e5-style encoders expect these prefixes; set both to "" for models that don't
+ONNX_QUERY_PREFIX = os.getenv("NIKA_ONNX_QUERY_PREFIX", "query: ")
+ONNX_PASSAGE_PREFIX = os.getenv("NIKA_ONNX_PASSAGE_PREFIX", "passage: ")
+ONNX_MAX_TOKENS = int(os.getenv("NIKA_ONNX_MAX_TOKENS", "512"))
+ONNX_THREADS = int(os.getenv("NIKA_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+ONNX_BATCH_SIZE = int(os.getenv("NIKA_ONNX_BATCH_SIZE", "32"))
+
+MICROBATCH_MS = float(os.getenv("NIKA_EMBED_MICROBATCH_MS", "2"))
+MICROBATCH_MAX = int(os.getenv("NIKA_EMBED_MICROBATCH_MAX", "32"))
+
+
+# ----------------------------------------------------
+# 🧩 Embedder interface
+# ----------------------------------------------------
+class Embedder(ABC):
+    """
+    `model` is the id recorded in build manifests; `dimensions` the vector
+    size (None until known). Documents and queries may be encoded
+    differently (e.g. e5 prefixes) — use the matching method.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str, dimensions: int | None = None):
+        self.model = model
+        self.dimensions = dimensions
+
+    def warmup(self):
+        """Load anything expensive up front (called when a build goes live)."""
+
+    @abstractmethod
+    def embed_query(self, text: str) -> np.ndarray:
+        """One query vector (float32). Blocking; safe to call from many threads."""
+
+    @abstractmethod
+    async def embed_documents(self, texts: list[str], cache: EmbeddingCache | None = None) -> np.ndarray:
+        """Matrix whose row i belongs to texts[i]; `cache` skips already-embedded texts."""
+
+
+# ----------------------------------------------------
+# ☁️ OpenAI embeddings API
+# ----------------------------------------------------
+class OpenAIEmbedder(Embedder):
+    name = "openai"
+
+    def __init__(self, model: str = EMBED_MODEL, dimensions: int | None = None):
+        super().__init__(model, dimensions)
+        self._client = None
+
+    def embed_query(self, text: str) -> np.ndarray:
+        from rag.embeddings import supports_dimensions
+
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        extra = {"dimensions": self.dimensions} if self.dimensions and supports_dimensions(self.model) else {}
+        response = self._client.embeddings.create(model=self.model, input=[text], **extra)
+        return np.array(response.data[0].embedding, dtype="float32")
+
+    async def embed_documents(self, texts: list[str], cache: EmbeddingCache | None = None) -> np.ndarray:
+        from rag.embeddings import embed_texts
+
+        return await embed_texts(texts, model=self.model, dimensions=self.dimensions, cache=cache)
+
+
+# ----------------------------------------------------
+# 🖥️ Local ONNX sentence encoder (CPU)
+# ----------------------------------------------------
+def onnx_model_dir(name: str = ONNX_MODEL) -> Path:
+    """Directory of an ONNX model given its name under models/ or a path."""
+    if Path(name).name == Path(ONNX_MODEL).name and Path(ONNX_MODEL).is_dir():
+        return Path(ONNX_MODEL)
+    return Path(name) if Path(name).is_dir() else MODELS_DIR / name
+
+
+class OnnxEmbedder(Embedder):
+    """
+    One InferenceSession per process, loaded on first use (or warmup).
+    Token embeddings are mean-pooled over the attention mask and
+    L2-normalized, matching sentence-transformers encoders.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str = ONNX_MODEL):
+        self.model_dir = onnx_model_dir(model_name)
+        super().__init__(f"onnx:{self.model_dir.name}")
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self._batcher = MicroBatcher(self._encode_queries, MICROBATCH_MAX, MICROBATCH_MS, name="nika-onnx-embed")
+
+    def _load(self):
+        with self._lock:
+            if self._session is None:
+                # Optional dependencies — only imported when selected
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+
+                model_path = next(
+                    (p for p in (self.model_dir / "model.onnx", self.model_dir / "onnx" / "model.onnx") if p.exists()),
+                    None,
+                )
+                if model_path is None:
+                    raise FileNotFoundError(f"No model.onnx in {self.model_dir}")
+
+                print(f"🧠 Loading ONNX embedder '{self.model_dir.name}' (CPU)...")
+                tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+                tokenizer.enable_truncation(ONNX_MAX_TOKENS)
+                if tokenizer.padding is None:
+                    pad = next((t for t in ("<pad>", "[PAD]") if tokenizer.token_to_id(t) is not None), None)
+                    tokenizer.enable_padding(pad_id=tokenizer.token_to_id(pad) if pad else 0, pad_token=pad or "[PAD]")
+
+                options = ort.SessionOptions()
+                if ONNX_THREADS:
+                    options.intra_op_num_threads = ONNX_THREADS
+                session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+                self._tokenizer = tokenizer
+                self._session = session
+                self.dimensions = int(self._encode([""])[0].shape[0])
+        return self._session
+
+    def warmup(self):
+        self._load()
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype="int64")
+        mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        inputs = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        wanted = {i.name for i in self._session.get_inputs()}
+        output = self._session.run(None, {k: v for k, v in inputs.items() if k in wanted})[0]
+
+        if output.ndim == 3:  # token embeddings → mean over real tokens
+            weights = mask[..., None].astype("float32")
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        output = output.astype("float32", copy=False)
+        return output / np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+
+    def _encode_queries(self, texts: list[str]) -> np.ndarray:
+        self._load()
+        return self._encode([ONNX_QUERY_PREFIX + t for t in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._batcher(text)
+
+    def _encode_documents(self, texts: list[str]) -> np.ndarray:
+        self._load()
+        rows = [self._encode([ONNX_PASSAGE_PREFIX + t for t in texts[i:i + ONNX_BATCH_SIZE]])
+                for i in range(0, len(texts), ONNX_BATCH_SIZE)]
+        return np.vstack(rows) if rows else np.zeros((0, self.dimensions or 0), dtype="float32")
+
+    async def embed_documents(self, texts: list[str], cache: EmbeddingCache | None = None) -> np.ndarray:
+        await asyncio.to_thread(self._load)
+        hashes = [text_hash(t) for t in texts]
+        vectors = cache.get_many(hashes, self.model, self.dimensions) if cache else {}
+        to_embed = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        if cache:
+            hits = sum(1 for h in hashes if h in vectors)
+            print(f"♻️ Embedding cache: {hits}/{len(hashes)} hits, {len(to_embed)} texts to embed locally.")
+
+        if to_embed:
+            rows = await asyncio.to_thread(self._encode_documents, list(to_embed.values()))
+            items = list(zip(to_embed, rows))
+            vectors.update(items)
+            if cache:
+                await asyncio.to_thread(cache.put_many, items, self.model, self.dimensions)
+
+        if not hashes:
+            return np.zeros((0, self.dimensions or 0), dtype="float32")
+        return np.vstack([vectors[h] for h in hashes]).astype("float32", copy=False)
+
+
+# ----------------------------------------------------
+# #️⃣ Hashed bag-of-words (offline stand-in)
+# ----------------------------------------------------
+class HashEmbedder(Embedder):
+    """
+    Signed feature hashing of BM25 tokens and their character trigrams
+    (Persian folded like rag/lexical.py), L2-normalized. Not semantic, but
+    stable across runs and machines, so retrieval benchmarks can build an
+    index and embed queries without any model or API.
+    """
+
+    name = "hash"
+
+    def __init__(self, dimensions: int = 512):
+        super().__init__(f"hash:{dimensions}", dimensions)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        from rag.lexical import tokenize
+
+        rows = np.zeros((len(texts), self.dimensions), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                padded = f"#{token}#"
+                for feature in [token] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+                    h = zlib.crc32(feature.encode("utf-8"))
+                    rows[row, h % self.dimensions] += 1.0 if (h >> 16) & 1 else -1.0
+        return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._encode([text])[0]
+
+    async def embed_documents(self, texts: list[str], cache: EmbeddingCache | None = None) -> np.ndarray:
+        return self._encode(texts)
+
+
+# ----------------------------------------------------
+# 🗂️ Registry
+# ----------------------------------------------------
+_instances: dict[tuple, Embedder] = {}
+_instances_lock = threading.Lock()
+
+
+def default_model() -> str:
+    """Model id new builds use (NIKA_EMBED_BACKEND / NIKA_EMBED_MODEL / NIKA_ONNX_MODEL)."""
+    if EMBED_BACKEND == "onnx":
+        return f"onnx:{Path(ONNX_MODEL).name}"
+    if EMBED_BACKEND != "openai":
+        raise ValueError(f"Unknown embedding backend: {EMBED_BACKEND}")
+    return EMBED_MODEL
+
+
+def get_embedder(model: str | None = None, dimensions: int | None = None) -> Embedder:
+    """
+    Resolve an embedder by model id (None → the configured default model
+    and NIKA_EMBED_DIMENSIONS). "onnx:<name>" selects the local encoder,
+    "hash:<dims>" the hashing stand-in, anything else the OpenAI API.
+    One instance per (model, dimensions) per process.
+    """
+    if model is None:
+        model, dimensions = default_model(), dimensions or EMBED_DIMENSIONS
+    key = (model, None if model.startswith(("onnx:", "hash:")) else dimensions)
+    with _instances_lock:
+        if key not in _instances:
+            if model.startswith("onnx:"):
+                _instances[key] = OnnxEmbedder(model.split(":", 1)[1])
+            elif model.startswith("hash:"):
+                _instances[key] = HashEmbedder(int(model.split(":", 1)[1]))
+            else:
+                _instances[key] = OpenAIEmbedder(model, dimensions)
+        return _instances[key]
@@ -0,0 +1,81 @@
+# rag/embedding_cache.py
+"""
+Persistent embedding store keyed by (sha256(text), model, dimensions).
+
+Index rebuilds look every chunk up here first and only send new or
+changed text to the embeddings API, so routine rebuilds cost (almost)
+nothing. Vectors are stored as raw float32 blobs in SQLite.
+"""
+
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+EMBED_CACHE_PATH = Path(__file__).resolve().parent / "embedding_cache.sqlite"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Path = EMBED_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (text_hash, model, dimensions)
+            )
+            """
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes: list[str], model: str, dimensions: int | None) -> dict[str, np.ndarray]:
+        """Return {hash: vector} for every hash already embedded with this model."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, dimensions or 0, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype="float32")
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, items: list[tuple[str, np.ndarray]], model: str, dimensions: int | None):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (text_hash, model, dimensions, vector) VALUES (?, ?, ?, ?)",
+                [
+                    (h, model, dimensions or 0, np.asarray(v, dtype="float32").tobytes())
+                    for h, v in items
+                ],
+            )
+            self._conn.commit()
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
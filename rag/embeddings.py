@@ -0,0 +1,158 @@
+# rag/embeddings.py
+"""
+Bulk embedding builder for the RAG index.
+
+Inputs are packed into token-aware batches that respect the embeddings
+API's per-request limits, sent with bounded concurrency and exponential
+backoff. Texts already in the embedding cache (rag/embedding_cache.py)
+are never re-sent, so rebuilds only pay for new or changed chunks.
+Output rows always follow input order.
+"""
+
+import os
+import random
+import asyncio
+
+import numpy as np
+from openai import BadRequestError
+
+from rag.embedding_cache import EmbeddingCache, text_hash
+
+# Embeddings API limits (per request)
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+EMBED_CONCURRENCY = int(os.getenv("NIKA_EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("NIKA_EMBED_MAX_RETRIES", "6"))
+EMBED_BATCH_TOKENS = int(os.getenv("NIKA_EMBED_BATCH_TOKENS", "100000"))
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """cl100k_base (text-embedding-3-*), or None if tiktoken can't load it."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({e}) — estimating tokens from length.")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is None:
+        # Conservative estimate: ~2 chars per token covers Persian text too
+        return len(text) // 2 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_to_limit(text: str, max_tokens: int = MAX_TOKENS_PER_INPUT) -> str:
+    """Cut a single input down to the model's per-input token limit."""
+    enc = _get_encoding()
+    if enc is None:
+        return text[: max_tokens * 2]
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def pack_batches(
+    texts: list[str],
+    max_tokens: int = EMBED_BATCH_TOKENS,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+) -> list[list[int]]:
+    """Group input positions into consecutive batches under both limits."""
+    max_tokens = min(max_tokens, MAX_TOKENS_PER_REQUEST)
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = min(count_tokens(text), MAX_TOKENS_PER_INPUT)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def supports_dimensions(model: str) -> bool:
+    """Only text-embedding-3-* accept `dimensions`; older models reject it."""
+    return model.startswith("text-embedding-3")
+
+
+async def _embed_batch(client, texts: list[str], model: str, dimensions: int | None) -> np.ndarray:
+    """One embeddings request with exponential backoff + jitter."""
+    extra = {"dimensions": dimensions} if dimensions and supports_dimensions(model) else {}
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            response = await client.embeddings.create(model=model, input=texts, **extra)
+            data = sorted(response.data, key=lambda item: item.index)
+            return np.array([item.embedding for item in data], dtype="float32")
+        except BadRequestError:
+            raise  # malformed input — retrying won't help
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            delay = min(30.0, 2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️ Embedding batch failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def embed_texts(
+    texts: list[str],
+    model: str,
+    dimensions: int | None = None,
+    client=None,
+    concurrency: int = EMBED_CONCURRENCY,
+    cache: EmbeddingCache | None = None,
+) -> np.ndarray:
+    """
+    Embed `texts` and return a float32 matrix whose row i belongs to texts[i].
+    With `cache`, known texts are served from it and only new or changed
+    ones are sent to the API; each finished batch is written back at once,
+    so a crashed rebuild resumes where it stopped.
+    """
+    if client is None:
+        from utils.openai_client import client
+
+    if not texts:
+        return np.zeros((0, dimensions or 0), dtype="float32")
+
+    inputs = [truncate_to_limit(t) for t in texts]
+    hashes = [text_hash(t) for t in inputs]
+    vectors: dict[str, np.ndarray] = cache.get_many(hashes, model, dimensions) if cache else {}
+
+    # Embed each missing text once, even if it appears several times
+    to_embed = {h: t for h, t in zip(hashes, inputs) if h not in vectors}
+    pending, missing = list(to_embed), list(to_embed.values())
+
+    hits = sum(1 for h in hashes if h in vectors)
+    print(
+        f"♻️ Embedding cache: {hits}/{len(hashes)} hits "
+        f"({hits / len(hashes):.0%}), {len(missing)} texts to embed."
+    )
+
+    if missing:
+        batches = pack_batches(missing)
+        limiter = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(positions: list[int]):
+            async with limiter:
+                result = await _embed_batch(client, [missing[i] for i in positions], model, dimensions)
+            items = [(pending[i], row) for i, row in zip(positions, result)]
+            vectors.update(items)
+            if cache:
+                await asyncio.to_thread(cache.put_many, items, model, dimensions)
+
+        print(f"🔢 Embedding {len(missing)} texts in {len(batches)} batches (concurrency {concurrency})...")
+        await asyncio.gather(*[run(positions) for positions in batches])
+
+    return np.vstack([vectors[h] for h in hashes]).astype("float32", copy=False)
@@ -0,0 +1,152 @@
+# rag/filters.py
+"""
+Metadata filters for retrieval (country, visa_type, language, source).
+
+Each build's chunk store carries per-chunk metadata (see
+scripts/metadata.py). `MetadataIndex` turns it into sorted ID arrays per
+(field, value), so a filter resolves to the exact subset of vector IDs to
+search — applied inside the ANN search through a FAISS IDSelector rather
+than by over-fetching and discarding.
+
+`detect_filters` derives filters from country names in the question and
+from the detected intent (English and Persian). The intent classifier is
+a loose substring matcher ("pr" in "processing", «کار» in many Persian
+words), so its intent only becomes a hard visa_type filter when the
+question also names that visa type as a whole word or phrase; otherwise
+retrieval keeps the soft intent keyword bias.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from rag.lexical import TOKEN, normalize_text
+
+FILTER_FIELDS = ("country", "visa_type", "language", "source")
+
+# Intents that are also visa_type values in the chunk metadata
+VISA_TYPE_INTENTS = {
+    "student_visa", "startup_visa", "visitor_visa",
+    "freelancer_visa", "residence_permit", "family_reunion",
+}
+
+COUNTRY_TERMS = {
+    "uk": ["uk", "united kingdom", "britain", "england", "british", "انگلیس", "انگلستان", "بریتانیا"],
+    "finland": ["finland", "finnish", "فنلاند"],
+    "sweden": ["sweden", "swedish", "سوئد"],
+    "netherlands": ["netherlands", "holland", "dutch", "هلند"],
+    "germany": ["germany", "german", "آلمان"],
+}
+
+
+# Whole-word cues that make a visa_type filter safe (phrases match word by word)
+VISA_TYPE_TERMS = {
+    "student_visa": [
+        "student", "students", "study", "studying", "university", "universities", "college",
+        "msc", "phd", "bachelor", "master", "masters", "tuition", "scholarship",
+        "دانشجو", "دانشجویی", "تحصیل", "تحصیلی", "تحصیلات", "دانشگاه", "بورسیه",
+    ],
+    "startup_visa": [
+        "startup", "start up", "founder", "entrepreneur", "entrepreneurs", "innovative business",
+        "استارتاپ", "استارت آپ", "کارآفرین", "کارآفرینی",
+    ],
+    "visitor_visa": [
+        "tourist", "tourism", "visitor", "visit visa", "visitor visa", "holiday", "short stay",
+        "توریستی", "توریست", "ویزای بازدید", "مسافرت",
+    ],
+    "freelancer_visa": [
+        "freelancer", "freelance", "freelancing", "self employed", "work permit", "work visa",
+        "job", "jobs", "employment", "employer", "skilled worker",
+        "فریلنسر", "فریلنسری", "خویش فرما", "ویزای کار", "اجازه کار",
+    ],
+    "residence_permit": [
+        "residence", "residency", "permanent", "pr", "citizenship",
+        "اقامت", "اقامتی", "شهروندی",
+    ],
+    "family_reunion": [
+        "family reunion", "family reunification", "spouse", "partner visa", "dependent", "dependents",
+        "همسر", "الحاق", "پیوست خانواده",
+    ],
+}
+
+
+class MetadataIndex:
+    def __init__(self, store):
+        values = defaultdict(lambda: defaultdict(list))
+        for chunk_id in store.ids():
+            meta = store.metadata(chunk_id) or {}
+            for field in FILTER_FIELDS:
+                if meta.get(field):
+                    values[field][meta[field]].append(int(chunk_id))
+        self._ids = {
+            field: {value: np.array(ids, dtype="int64") for value, ids in by_value.items()}
+            for field, by_value in values.items()
+        }
+
+    def values(self, field: str) -> list[str]:
+        return sorted(self._ids.get(field, {}))
+
+    def select(self, filters: dict) -> np.ndarray:
+        """Sorted IDs matching every filter (a value may also be a list of values)."""
+        selected = None
+        for field, wanted in filters.items():
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            by_value = self._ids.get(field, {})
+            ids = np.unique(np.concatenate(
+                [by_value[v] for v in wanted if v in by_value] or [np.zeros(0, dtype="int64")]
+            ))
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+        return selected if selected is not None else np.zeros(0, dtype="int64")
+
+
+# Fold the terms the same way queries are folded (e.g. Arabic yeh in «سوئد»)
+COUNTRY_TERMS = {country: [normalize_text(t) for t in terms] for country, terms in COUNTRY_TERMS.items()}
+VISA_TYPE_TERMS = {
+    visa_type: [" ".join(TOKEN.findall(normalize_text(t))) for t in terms]
+    for visa_type, terms in VISA_TYPE_TERMS.items()
+}
+
+
+def _words(query: str) -> str:
+    return f" {' '.join(TOKEN.findall(normalize_text(query)))} "
+
+
+def detect_country(query: str) -> str | None:
+    text = _words(query)
+    for country, terms in COUNTRY_TERMS.items():
+        if any(f" {term} " in text or (not term.isascii() and term in text) for term in terms):
+            return country
+    return None
+
+
+def names_visa_type(query: str, visa_type: str) -> bool:
+    """True when `query` names `visa_type` with a whole-word cue."""
+    text = _words(query)
+    return any(f" {term} " in text for term in VISA_TYPE_TERMS.get(visa_type, ()))
+
+
+def detect_filters(query: str, intent: str = "unknown") -> dict:
+    filters = {}
+    country = detect_country(query)
+    if country:
+        filters["country"] = country
+    if intent in VISA_TYPE_INTENTS and names_visa_type(query, intent):
+        filters["visa_type"] = intent
+    return filters
+
+
+def relaxations(filters: dict) -> list[dict]:
+    """
+    Filters to try in order: as given, then without visa_type, then none.
+    Callers stop at the unfiltered step once they have any result, so
+    other countries never fill slots when the asked-about one has matches.
+    """
+    steps = [dict(filters)]
+    if "visa_type" in filters:
+        steps.append({k: v for k, v in filters.items() if k != "visa_type"})
+    steps.append({})
+    unique = []
+    for step in steps:
+        if step not in unique:
+            unique.append(step)
+    return unique
@@ -0,0 +1,227 @@
+# rag/index_factory.py
+"""
+FAISS index construction for the RAG knowledge base.
+
+The index type comes from NIKA_INDEX_TYPE:
+  • flat      exact search (the baseline)
+  • hnsw      graph index — fast, high recall, no training, no deletes
+  • ivf_flat  inverted lists over full vectors (trained on the corpus)
+  • ivf_pq    inverted lists over product-quantized codes (smallest)
+
+NIKA_VECTOR_STORAGE sets how flat / hnsw / ivf_flat store vectors:
+float32 (exact), float16 (2x smaller) or int8 scalar-quantized codes (4x
+smaller). Lossy builds ship a full-precision vector file the retriever
+reranks the shortlist with (rag/vector_store.py).
+
+All types use inner product on L2-normalized vectors (= cosine
+similarity) and are wrapped in `IndexIDMap2`, so hits are stable chunk
+IDs. Training happens here, at build time; query-time knobs (efSearch,
+nprobe) are applied by `configure_search` after loading.
+"""
+
+import os
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+INDEX_TYPE = os.getenv("NIKA_INDEX_TYPE", "flat")
+
+VECTOR_STORAGES = ("float32", "float16", "int8")
+VECTOR_STORAGE = os.getenv("NIKA_VECTOR_STORAGE", "float32")
+SQ_TYPES = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,  # per-dimension min/max, trained on the corpus
+}
+
+HNSW_M = int(os.getenv("NIKA_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("NIKA_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("NIKA_HNSW_EF_SEARCH", "64"))
+
+IVF_NLIST = int(os.getenv("NIKA_IVF_NLIST", "0"))  # 0 = derive from corpus size
+IVF_NPROBE = int(os.getenv("NIKA_IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("NIKA_PQ_M", "64"))
+PQ_NBITS = int(os.getenv("NIKA_PQ_NBITS", "8"))
+
+# Below this many vectors IVF/PQ can't be trained meaningfully
+MIN_TRAIN_VECTORS = 64
+
+# Memory-map indexes read-only so worker processes share one page-cache copy
+RAG_MMAP = os.getenv("NIKA_RAG_MMAP", "1") == "1"
+MMAP_FLAGS = {
+    "flat": faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,      # flat codes
+    "ivf_flat": faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,      # inverted lists
+    "ivf_pq": faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+    # hnsw: no mmap support for the graph — every worker holds a private copy
+}
+
+
+def normalize(vectors) -> np.ndarray:
+    """Row-wise L2 normalization (copy) so inner product == cosine."""
+    vectors = np.array(vectors, dtype="float32", copy=True)
+    if len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _nlist(n: int) -> int:
+    if IVF_NLIST:
+        return max(1, min(IVF_NLIST, n))
+    # ~4·√n lists, but keep ≥39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count ≤ PQ_M that divides `dim`."""
+    for m in range(min(PQ_M, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _pq_nbits(n: int) -> int:
+    # k-means wants ~39 training points per centroid (2^nbits centroids)
+    return max(4, min(PQ_NBITS, int(math.log2(max(n // 39, 2)))))
+
+
+def resolve_index_type(index_type: str, n_train: int) -> str:
+    """The type actually built for `n_train` vectors (IVF needs enough to train)."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}' (choose from {', '.join(INDEX_TYPES)})")
+    if index_type in ("ivf_flat", "ivf_pq") and n_train < MIN_TRAIN_VECTORS:
+        return "flat"
+    return index_type
+
+
+def create_index(dim: int, index_type: str = INDEX_TYPE, n_train: int = 0, storage: str = VECTOR_STORAGE):
+    """An empty (untrained) ID-mapped index of the requested type and vector storage."""
+    resolved = resolve_index_type(index_type, n_train)
+    if resolved != index_type:
+        print(f"ℹ️ Only {n_train} vectors — too few to train {index_type}, using flat.")
+        index_type = resolved
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(f"Unknown vector storage '{storage}' (choose from {', '.join(VECTOR_STORAGES)})")
+    qtype = SQ_TYPES.get(storage)
+
+    metric = faiss.METRIC_INNER_PRODUCT
+    if index_type == "flat":
+        base = faiss.IndexScalarQuantizer(dim, qtype, metric) if qtype is not None else faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        if qtype is not None:
+            base = faiss.IndexHNSWSQ(dim, qtype, HNSW_M, metric)
+        else:
+            base = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        if qtype is not None:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, _nlist(n_train), qtype, metric)
+        else:
+            base = faiss.IndexIVFFlat(quantizer, dim, _nlist(n_train), metric)
+        base.own_fields = True
+        quantizer.this.disown()
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, _nlist(n_train), _pq_m(dim), _pq_nbits(n_train), metric)
+        base.own_fields = True
+        quantizer.this.disown()
+
+    return faiss.IndexIDMap2(base)
+
+
+def build_index(vectors, ids, index_type: str = INDEX_TYPE, storage: str = VECTOR_STORAGE):
+    """Normalize, train (if needed) and fill an ID-mapped index."""
+    vectors = normalize(vectors)
+    index = create_index(vectors.shape[1], index_type, n_train=len(vectors), storage=storage)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    configure_search(index)
+    return index
+
+
+def index_kind(index) -> str:
+    """Which of INDEX_TYPES a (possibly ID-mapped) index is."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def index_storage(index) -> str:
+    """How the index stores vectors: one of VECTOR_STORAGES, or "pq"."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return next((name for name, qtype in SQ_TYPES.items() if qtype == base.sq.qtype), "sq")
+    return "float32"
+
+
+def needs_rerank(index) -> bool:
+    """Lossy codes: rerank the shortlist against full-precision vectors."""
+    return index_storage(index) != "float32"
+
+
+def supports_removal(index) -> bool:
+    return index_kind(index) != "hnsw"
+
+
+def uses_inner_product(index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def configure_search(index, ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE):
+    """Apply query-time parameters (they are not all persisted with the index)."""
+    kind = index_kind(index)
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else faiss.downcast_index(index)
+    if kind == "hnsw":
+        base.hnsw.efSearch = ef_search
+    elif kind in ("ivf_flat", "ivf_pq"):
+        base.nprobe = min(nprobe, base.nlist)
+    return index
+
+
+def read_index(path, index_type: str = "", mmap: bool = RAG_MMAP):
+    """
+    Load an index, memory-mapped when its type supports it. Mapped pages
+    are clean and file-backed: N workers share one physical copy instead
+    of N private heaps. Falls back to a normal read if mapping fails.
+    """
+    flags = MMAP_FLAGS.get(index_type, 0) if mmap else 0
+    if flags:
+        try:
+            return faiss.read_index(str(path), flags)
+        except RuntimeError as e:
+            print(f"⚠️ mmap load failed for {index_type} index ({e}); reading into memory.")
+    return faiss.read_index(str(path))
+
+
+def search_params(index, ids, ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE):
+    """
+    Search parameters restricting results to `ids` (stable chunk IDs).
+    The selector is evaluated inside the search, so filtered-out vectors
+    never take result slots; IndexIDMap2 translates it to internal rows.
+    """
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    kind = index_kind(index)
+    if kind == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    params.referenced_selector = selector  # keep the selector alive with the params
+    return params
+
+
+def index_bytes(index) -> int:
+    """Serialized size — a close proxy for the index's resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
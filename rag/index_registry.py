@@ -0,0 +1,107 @@
+# rag/index_registry.py
+"""
+Stable chunk IDs for the FAISS index.
+
+Every indexed text has a stable key (its chunk file path or
+`visa_programs:<row id>`) mapped to a permanent integer ID, which is the
+ID stored in the `IndexIDMap2`. IDs are never reused, so a chunk that is
+edited keeps its ID and a deleted chunk's ID can't resurface pointing at
+other text. The registry also keeps each chunk's text and metadata, from
+which the chunk store (rag/chunk_store.py) is written.
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+from rag.embedding_cache import text_hash
+
+REGISTRY_PATH = Path(__file__).resolve().parent / "index_registry.sqlite"
+
+
+class ChunkRegistry:
+    def __init__(self, path: Path = REGISTRY_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE NOT NULL,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                meta TEXT NOT NULL DEFAULT '{}'
+            )
+            """
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        if "meta" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN meta TEXT NOT NULL DEFAULT '{}'")
+        self._conn.commit()
+
+    def entries(self) -> dict[str, tuple[int, str]]:
+        """{key: (id, text_hash)} for every registered chunk."""
+        rows = self._conn.execute("SELECT key, id, text_hash FROM chunks")
+        return {key: (chunk_id, h) for key, chunk_id, h in rows}
+
+    def ids(self) -> list[int]:
+        return [row[0] for row in self._conn.execute("SELECT id FROM chunks ORDER BY id")]
+
+    def texts(self) -> dict[int, str]:
+        return dict(self._conn.execute("SELECT id, text FROM chunks"))
+
+    def chunks(self) -> dict[int, tuple[str, dict]]:
+        """{id: (text, metadata)} — what the chunk store is written from."""
+        rows = self._conn.execute("SELECT id, text, meta FROM chunks")
+        return {chunk_id: (text, json.loads(meta)) for chunk_id, text, meta in rows}
+
+    def diff(self, records: dict[str, str]):
+        """
+        Compare the current source records ({key: text}) with the registry.
+        Returns (added keys, changed keys, removed keys).
+        """
+        known = self.entries()
+        added = [key for key in records if key not in known]
+        changed = [
+            key for key, text in records.items()
+            if key in known and known[key][1] != text_hash(text)
+        ]
+        removed = [key for key in known if key not in records]
+        return added, changed, removed
+
+    # -----------------------------
+    # Mutations (committed by `commit()`)
+    # -----------------------------
+    def upsert(self, key: str, text: str, meta: dict | None = None) -> int:
+        """Register or update a chunk and return its (stable) ID."""
+        self._conn.execute(
+            "INSERT INTO chunks (key, text_hash, text, meta) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET text_hash = excluded.text_hash, "
+            "text = excluded.text, meta = excluded.meta",
+            (key, text_hash(text), text, json.dumps(meta or {}, ensure_ascii=False)),
+        )
+        return self._conn.execute("SELECT id FROM chunks WHERE key = ?", (key,)).fetchone()[0]
+
+    def remove(self, keys: list[str]) -> list[int]:
+        """Unregister chunks and return the IDs they held."""
+        ids = []
+        for key in keys:
+            row = self._conn.execute("SELECT id FROM chunks WHERE key = ?", (key,)).fetchone()
+            if row:
+                ids.append(row[0])
+                self._conn.execute("DELETE FROM chunks WHERE key = ?", (key,))
+        return ids
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def vacuum(self):
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+
+    def close(self):
+        self._conn.close()
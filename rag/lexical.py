@@ -0,0 +1,148 @@
+# rag/lexical.py
+"""
+In-process BM25 index over the chunk store, for English and Persian.
+
+Keyword-heavy questions ("IND", "RVO", "KvK", fee amounts, Persian terms)
+are matched exactly here, fused with the vector results by reciprocal
+rank fusion, and — when the lexical match is unambiguous — answered
+without any embedding call at all.
+
+The tokenizer folds the usual Persian spelling variants together:
+Arabic yeh/kaf → Persian ی/ک, no diacritics or tatweel, Persian/Arabic
+digits → ASCII, and ZWNJ treated as a word boundary (so «می‌خواهم»,
+«می خواهم» and their affixes tokenize alike).
+"""
+
+import os
+import re
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("NIKA_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("NIKA_BM25_B", "0.75"))
+RRF_K = int(os.getenv("NIKA_RRF_K", "60"))
+# A one-word query always has full coverage; it is never "unambiguous" on its own
+LEXICAL_MIN_TERMS = int(os.getenv("NIKA_LEXICAL_MIN_TERMS", "2"))
+
+PERSIAN_FOLD = str.maketrans({
+    "\u064a": "\u06cc", "\u0649": "\u06cc", "\u0626": "\u06cc",  # Arabic yeh / alef maksura → Persian yeh
+    "\u0643": "\u06a9",                                  # Arabic kaf → Persian kaf
+    "\u0629": "\u0647", "\u06c0": "\u0647",                  # teh marbuta / heh with yeh → heh
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0671": "\u0627",  # hamza / wasla alefs → alef
+    "\u0624": "\u0648",                                  # waw with hamza → waw
+    "\u0640": None,                                      # tatweel
+    "\u200c": " ",                                       # ZWNJ → word boundary
+    "\u200d": None,                                      # ZWJ
+    **{chr(0x06F0 + d): str(d) for d in range(10)},      # Persian digits
+    **{chr(0x0660 + d): str(d) for d in range(10)},      # Arabic digits
+})
+DIACRITICS = re.compile(r"[\u064b-\u065f\u0670]")
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    # English
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "the", "to", "what", "when",
+    "where", "which", "who", "with", "you", "your", "does", "need", "want",
+    # Persian (incl. affix particles split off by ZWNJ)
+    "و", "در", "به", "از", "که", "این", "آن", "را", "با", "برای", "است", "هست", "هم",
+    "یا", "تا", "می", "نمی", "ها", "های", "ای", "ی", "من", "چه", "چی", "چطور", "آیا",
+    "کنم", "کنید", "باید", "شود", "شد",
+}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).translate(PERSIAN_FOLD)
+    return DIACRITICS.sub("", text).casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN.findall(normalize_text(text)) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class BM25Index:
+    """Okapi BM25 over {chunk id: text}; postings are numpy arrays per term."""
+
+    def __init__(self, docs: dict[int, str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1, self.b = k1, b
+        self.ids = np.array(sorted(docs), dtype="int64")
+        lengths = np.zeros(len(self.ids), dtype="float32")
+        postings = defaultdict(lambda: ([], []))
+
+        for row, chunk_id in enumerate(self.ids):
+            counts = Counter(tokenize(docs[int(chunk_id)]))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term][0].append(row)
+                postings[term][1].append(tf)
+
+        n = max(len(self.ids), 1)
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self._norm = k1 * (1 - b + b * lengths / max(self.avg_length, 1e-9))
+        self._postings = {}
+        for term, (rows, tfs) in postings.items():
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            self._postings[term] = (np.array(rows, dtype="int32"), np.array(tfs, dtype="float32"), idf)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 10, allowed_ids: np.ndarray | None = None):
+        """
+        Top-k [(chunk id, score)] plus the share of query terms the best hit
+        contains. `allowed_ids` restricts the candidates (metadata filters).
+        """
+        terms = query_terms(query)
+        scores = np.zeros(len(self.ids), dtype="float32")
+        matched = np.zeros(len(self.ids), dtype="int32")
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs, idf = posting
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[rows])
+            matched[rows] += 1
+
+        if allowed_ids is not None:
+            scores[~np.isin(self.ids, allowed_ids)] = 0.0
+        top = np.argsort(-scores)[:k]
+        top = top[scores[top] > 0]
+        hits = [(int(self.ids[row]), float(scores[row])) for row in top]
+        coverage = matched[top[0]] / len(terms) if len(top) and terms else 0.0
+        return hits, coverage
+
+
+def query_terms(query: str) -> list[str]:
+    """Distinct search terms of `query`, in order."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def is_confident(
+    hits: list[tuple[int, float]],
+    coverage: float,
+    margin: float,
+    terms: int,
+    min_coverage: float = 1.0,
+    min_terms: int = LEXICAL_MIN_TERMS,
+) -> bool:
+    """
+    The query has at least `min_terms` terms, the best lexical hit contains
+    every one of them and it clearly beats the runner-up.
+    """
+    if not hits or terms < min_terms or coverage < min_coverage:
+        return False
+    if len(hits) == 1:
+        return True
+    return hits[0][1] >= margin * hits[1][1]
+
+
+def rrf_fuse(*rankings: list[int], k: int = 3, rrf_k: int = RRF_K) -> list[int]:
+    """Reciprocal rank fusion of several ranked ID lists."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] += 1.0 / (rrf_k + rank + 1)
+    return [chunk_id for chunk_id, _ in sorted(scores.items(), key=lambda item: -item[1])[:k]]
@@ -0,0 +1,124 @@
+# rag/manifest.py
+"""
+Versioned RAG index builds.
+
+Every sync writes a complete build into its own directory
+(rag/builds/<version>/: FAISS index + chunk store) and then atomically
+replaces rag/manifest.json, which names the current build and records:
+
+  version, built_at, model, dimensions, count, index_type,
+  files: {name: {"bytes": n, "sha256": ...}}
+
+Readers only ever follow the manifest, so they see either the old build
+or the new one — never a half-written file. Old builds are kept for a
+while so workers still serving from them are unaffected.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+
+RAG_DIR = Path(__file__).resolve().parent
+MANIFEST_PATH = RAG_DIR / "manifest.json"
+BUILDS_DIR = RAG_DIR / "builds"
+INDEX_FILE = "nika_index.faiss"
+KEEP_BUILDS = int(os.getenv("NIKA_INDEX_KEEP_BUILDS", "3"))
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def new_build_dir(builds_dir: Path = BUILDS_DIR) -> tuple[str, Path]:
+    """
+    Create the directory for a new build. Versions sort by creation time
+    (`prune_builds` relies on it): second, then zero-padded nanoseconds
+    within it, then the pid to keep concurrent builders apart.
+    """
+    ns = time.time_ns()
+    version = time.strftime("%Y%m%dT%H%M%S", time.localtime(ns // 1_000_000_000)) + f"-{ns % 1_000_000_000:09d}-{os.getpid()}"
+    path = Path(builds_dir) / version
+    path.mkdir(parents=True)
+    return version, path
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_manifest(path: Path = MANIFEST_PATH) -> dict | None:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Unreadable manifest {path}: {e}")
+
+
+def build_path(manifest: dict, name: str = INDEX_FILE, manifest_path: Path = MANIFEST_PATH) -> Path:
+    return Path(manifest_path).parent / manifest["build_dir"] / name
+
+
+def write_manifest(
+    version: str,
+    build_dir: Path,
+    *,
+    model: str,
+    dimensions: int,
+    count: int,
+    index_type: str,
+    manifest_path: Path = MANIFEST_PATH,
+    **extra,
+) -> dict:
+    """Checksum the build's files and publish it as the current build."""
+    build_dir = Path(build_dir)
+    manifest = {
+        "version": version,
+        "build_dir": os.path.relpath(build_dir, Path(manifest_path).parent),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "model": model,
+        "dimensions": int(dimensions),
+        "count": int(count),
+        "index_type": index_type,
+        **extra,
+        "files": {
+            path.name: {"bytes": path.stat().st_size, "sha256": file_sha256(path)}
+            for path in sorted(build_dir.iterdir()) if path.is_file()
+        },
+    }
+    tmp = Path(manifest_path).with_name(Path(manifest_path).name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def verify_build(manifest: dict, manifest_path: Path = MANIFEST_PATH):
+    """Raise ManifestError unless every listed file exists with its checksum."""
+    for key in ("version", "build_dir", "model", "dimensions", "count", "files"):
+        if key not in manifest:
+            raise ManifestError(f"Manifest is missing '{key}'")
+    if INDEX_FILE not in manifest["files"]:
+        raise ManifestError(f"Manifest lists no {INDEX_FILE}")
+    for name, expected in manifest["files"].items():
+        path = build_path(manifest, name, manifest_path)
+        if not path.exists():
+            raise ManifestError(f"Build file missing: {path}")
+        if path.stat().st_size != expected["bytes"] or file_sha256(path) != expected["sha256"]:
+            raise ManifestError(f"Checksum mismatch: {path}")
+
+
+def prune_builds(keep: int = KEEP_BUILDS, manifest_path: Path = MANIFEST_PATH, builds_dir: Path = BUILDS_DIR):
+    """Delete all but the newest `keep` builds (never the current one)."""
+    manifest = read_manifest(manifest_path)
+    current = Path(manifest_path).parent / manifest["build_dir"] if manifest else None
+    builds = sorted((p for p in Path(builds_dir).iterdir() if p.is_dir()), key=lambda p: p.name)
+    for path in builds[:-keep] if keep > 0 else builds:
+        if current is None or path.resolve() != current.resolve():
+            shutil.rmtree(path, ignore_errors=True)
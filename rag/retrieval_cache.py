@@ -0,0 +1,125 @@
+# rag/retrieval_cache.py
+"""
+Two-level cache in front of the retriever.
+
+  • embeddings: normalized (bias + query) text → query vector, so repeat
+    questions skip the embeddings round trip
+  • results: (normalized query, intent, k, index version) → retrieved
+    chunks, so they skip the FAISS search too
+
+Both levels are TTL + LRU bounded. Result entries carry the index
+version in their key and are dropped whenever the retriever loads a new
+index; embeddings stay valid because they don't depend on the index.
+"""
+
+import os
+import threading
+import unicodedata
+
+from cachetools import TTLCache
+
+RAG_EMBED_CACHE_SIZE = int(os.getenv("NIKA_RAG_EMBED_CACHE_SIZE", "5000"))
+RAG_EMBED_CACHE_TTL = int(os.getenv("NIKA_RAG_EMBED_CACHE_TTL", str(24 * 3600)))
+RAG_RESULT_CACHE_SIZE = int(os.getenv("NIKA_RAG_RESULT_CACHE_SIZE", "2000"))
+RAG_RESULT_CACHE_TTL = int(os.getenv("NIKA_RAG_RESULT_CACHE_TTL", "3600"))
+
+
+def normalize_query(text: str) -> str:
+    """Unicode-normalize, casefold and collapse whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+class RetrievalCache:
+    def __init__(
+        self,
+        embed_size: int = RAG_EMBED_CACHE_SIZE,
+        embed_ttl: int = RAG_EMBED_CACHE_TTL,
+        result_size: int = RAG_RESULT_CACHE_SIZE,
+        result_ttl: int = RAG_RESULT_CACHE_TTL,
+    ):
+        self._lock = threading.Lock()
+        self._embeddings = TTLCache(maxsize=embed_size, ttl=embed_ttl)
+        self._results = TTLCache(maxsize=result_size, ttl=result_ttl)
+        self._version = None
+        self.stats = {
+            "embedding_hits": 0,
+            "embedding_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0,
+            "invalidations": 0,
+            "lexical_fastpath": 0,
+            "hybrid_searches": 0,
+            "filter_relaxations": 0,
+        }
+
+    # -----------------------------
+    # Query embeddings
+    # -----------------------------
+    def get_embedding(self, model: str, text: str):
+        key = (model, normalize_query(text))
+        with self._lock:
+            vector = self._embeddings.get(key)
+            self.stats["embedding_hits" if vector is not None else "embedding_misses"] += 1
+            return vector
+
+    def peek_embedding(self, model: str, text: str):
+        """Like `get_embedding`, but not counted in the hit-rate stats."""
+        with self._lock:
+            return self._embeddings.get((model, normalize_query(text)))
+
+    def put_embedding(self, model: str, text: str, vector):
+        with self._lock:
+            self._embeddings[(model, normalize_query(text))] = vector
+
+    # -----------------------------
+    # Top-k results
+    # -----------------------------
+    def get_results(self, query: str, intent: str, k: int, version):
+        key = (normalize_query(query), intent, k, version)
+        with self._lock:
+            results = self._results.get(key)
+            self.stats["result_hits" if results is not None else "result_misses"] += 1
+            return results
+
+    def put_results(self, query: str, intent: str, k: int, version, results: list[str]):
+        with self._lock:
+            if version != self._version:
+                return
+            self._results[(normalize_query(query), intent, k, version)] = list(results)
+
+    def count(self, event: str):
+        """Bump a retrieval counter (e.g. "lexical_fastpath") shown in /metrics."""
+        with self._lock:
+            self.stats[event] = self.stats.get(event, 0) + 1
+
+    def set_version(self, version):
+        """Called when an index is loaded; drops results from older versions."""
+        with self._lock:
+            if version == self._version:
+                return
+            if self._version is not None:
+                self.stats["invalidations"] += 1
+            self._version = version
+            self._results.clear()
+
+    def clear(self):
+        """Drop every cached embedding and result (counters are kept)."""
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            embed_total = self.stats["embedding_hits"] + self.stats["embedding_misses"]
+            result_total = self.stats["result_hits"] + self.stats["result_misses"]
+            return {
+                **self.stats,
+                "embedding_hit_rate": round(self.stats["embedding_hits"] / embed_total, 3) if embed_total else 0.0,
+                "result_hit_rate": round(self.stats["result_hits"] / result_total, 3) if result_total else 0.0,
+                "embedding_entries": len(self._embeddings),
+                "result_entries": len(self._results),
+                "index_version": self._version,
+            }
+
+
+retrieval_cache = RetrievalCache()
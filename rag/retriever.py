@@ -1,33 +1,189 @@
 import os
-import faiss
+import time
+import threading
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from rag.retrieval_cache import retrieval_cache
+from rag.embedders import get_embedder
+from rag.index_factory import configure_search, normalize, read_index, search_params, uses_inner_product
+from rag.chunk_store import ChunkStore
+from rag.vector_store import RERANK_FACTOR, VectorStore, vectors_path
+from rag.lexical import BM25Index, is_confident, query_terms, rrf_fuse
+from rag.filters import MetadataIndex, detect_filters, relaxations
+from rag.manifest import (
+    INDEX_FILE,
+    MANIFEST_PATH,
+    ManifestError,
+    build_path,
+    read_manifest,
+    verify_build,
+)
+
 # ----------------------------------------------------
 # 🔐 Setup
 # ----------------------------------------------------
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-INDEX_PATH = "rag/nika_index.faiss"
-TEXT_PATH = "data/processed/all_knowledge.txt"
+RELOAD_CHECK_SECONDS = float(os.getenv("NIKA_RAG_RELOAD_SECONDS", "30"))
+
+# Hybrid retrieval: BM25 + vectors fused by RRF; confident BM25 hits skip the embedding call
+LEXICAL_FASTPATH = os.getenv("NIKA_LEXICAL_FASTPATH", "1") == "1"
+LEXICAL_MARGIN = float(os.getenv("NIKA_LEXICAL_MARGIN", "1.5"))
+CANDIDATES_PER_K = 4
+
+
+# ----------------------------------------------------
+# 📦 Index snapshots (double-buffered hot swap)
+# ----------------------------------------------------
+class RAGSnapshot:
+    """
+    One published build: FAISS index + chunk store + BM25 / metadata
+    indexes + its manifest, plus full-precision vectors for lossy indexes.
+    """
+
+    def __init__(
+        self,
+        manifest: dict,
+        index,
+        store: ChunkStore,
+        lexical: BM25Index,
+        metadata: MetadataIndex,
+        vectors: VectorStore | None = None,
+    ):
+        self.manifest = manifest
+        self.index = index
+        self.store = store
+        self.lexical = lexical
+        self.metadata = metadata
+        self.vectors = vectors
+        self.version = manifest["version"]
+        self.model = manifest["model"]
+        self.dimensions = manifest["dimensions"]
+
+
+def load_snapshot(manifest_path=MANIFEST_PATH) -> RAGSnapshot | None:
+    """
+    Load and validate the build the manifest points at.
+    Raises ManifestError if it is incomplete or inconsistent.
+    """
+    manifest = read_manifest(manifest_path)
+    if manifest is None:
+        return None
+    verify_build(manifest, manifest_path)
+
+    path = build_path(manifest, INDEX_FILE, manifest_path)
+    # mmap'd where possible: the index pages are shared by all workers (see Procfile)
+    index = configure_search(read_index(path, manifest.get("index_type", "")))
+    if index.d != manifest["dimensions"] or index.ntotal != manifest["count"]:
+        raise ManifestError(
+            f"Index has {index.ntotal}×{index.d}, manifest says {manifest['count']}×{manifest['dimensions']}"
+        )
+    store = ChunkStore(path)
+    if len(store) != manifest["count"]:
+        raise ManifestError(f"Chunk store has {len(store)} chunks, manifest says {manifest['count']}")
+
+    lexical = BM25Index({int(i): store.get(i) for i in store.ids()})
+    metadata = MetadataIndex(store)
+
+    vectors = None
+    if vectors_path(path).name in manifest["files"]:
+        vectors = VectorStore(path)
+        if vectors.dimensions != index.d:
+            raise ManifestError(f"Rerank vectors have {vectors.dimensions} dims, index has {index.d}")
+
+    # Warm up before going live so the first real query isn't the slow one
+    # (a local query embedder that can't load rejects the build)
+    get_embedder(manifest["model"], manifest["dimensions"]).warmup()
+    if index.ntotal:
+        index.search(np.zeros((1, index.d), dtype="float32"), 1)
+    return RAGSnapshot(manifest, index, store, lexical, metadata, vectors)
+
+
+_snapshot: RAGSnapshot | None = None   # live build; replaced by reference, never mutated
+_manifest_stamp = None
+_last_check = 0.0
+_reload_lock = threading.Lock()
+_loading = False
+_pinned = False  # serving a snapshot set by pin_snapshot; manifest changes are ignored
+
+
+def _stamp(path=MANIFEST_PATH):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def reload_index() -> bool:
+    """
+    Load the current manifest's build and swap it in. Until the swap,
+    requests keep using the previous snapshot; a build that fails
+    validation is never served. Returns True if a new snapshot went live.
+    """
+    global _snapshot, _manifest_stamp
+    stamp = _stamp()
+    try:
+        snapshot = load_snapshot()
+    except (ManifestError, OSError, RuntimeError, ValueError) as e:
+        print(f"⚠️ RAG build rejected ({e}) — keeping the current index.")
+        _manifest_stamp = stamp
+        return False
+
+    _manifest_stamp = stamp
+    if snapshot is None:
+        print("⚠️ No index manifest — run `python -m scripts.sync_rag_from_db`. RAG will rely on GPT reasoning.")
+        return False
+    if _snapshot is not None and snapshot.version == _snapshot.version:
+        return False
+
+    _snapshot = snapshot
+    retrieval_cache.set_version(snapshot.version)
+    print(f"✅ RAG build {snapshot.version} live ({snapshot.index.ntotal} chunks, {snapshot.model}).")
+    return True
+
+
+def _background_reload():
+    global _loading
+    try:
+        reload_index()
+    finally:
+        _loading = False
 
-# Load FAISS index
-if os.path.exists(INDEX_PATH):
-    index = faiss.read_index(INDEX_PATH)
-    print("✅ FAISS index loaded.")
-else:
-    index = None
-    print("⚠️ No FAISS index found — RAG will rely on GPT reasoning.")
 
-# Load text data (aligned with FAISS index vectors)
-if os.path.exists(TEXT_PATH):
-    with open(TEXT_PATH, "r", encoding="utf-8") as f:
-        all_texts = [line.strip() for line in f.readlines() if line.strip()]
-else:
-    all_texts = []
-    print("⚠️ No processed text file found — context retrieval disabled.")
+def _maybe_reload():
+    """Check the manifest at most every RELOAD_CHECK_SECONDS; load changes off the request path."""
+    global _last_check, _loading
+    now = time.monotonic()
+    if _pinned or now - _last_check < RELOAD_CHECK_SECONDS:
+        return
+    with _reload_lock:
+        if now - _last_check < RELOAD_CHECK_SECONDS or _loading:
+            return
+        _last_check = now
+        if _stamp() == _manifest_stamp:
+            return
+        _loading = True
+    threading.Thread(target=_background_reload, name="rag-reload", daemon=True).start()
+
+
+def current_snapshot() -> RAGSnapshot | None:
+    return _snapshot
+
+
+def pin_snapshot(snapshot: RAGSnapshot):
+    """
+    Serve `snapshot` (e.g. a benchmark build) instead of the published
+    build, and stop following the manifest until the process exits.
+    """
+    global _snapshot, _pinned
+    _pinned = True
+    _snapshot = snapshot
+    retrieval_cache.set_version(snapshot.version)
+
+
+reload_index()
 
 
 # ----------------------------------------------------
@@ -47,42 +203,142 @@ intent_bias = {
 # ----------------------------------------------------
 # 🧠 Helper: Generate embedding
 # ----------------------------------------------------
-def get_embedding(text: str):
-    """Convert text into an embedding vector."""
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=[text],
-    )
-    return np.array(response.data[0].embedding, dtype="float32")
+def _embedding_key(model: str, dimensions: int | None) -> str:
+    return f"{model}:{dimensions or ''}"
+
+
+def get_embedding(text: str, model: str, dimensions: int | None = None):
+    """
+    Convert text into an embedding vector (cached per normalized text).
+    `model` / `dimensions` must match the index build (see its manifest);
+    "onnx:<name>" models run locally, others call the embeddings API.
+    """
+    cache_key = _embedding_key(model, dimensions)
+    vector = retrieval_cache.get_embedding(cache_key, text)
+    if vector is not None:
+        return vector
+
+    vector = get_embedder(model, dimensions).embed_query(text)
+    retrieval_cache.put_embedding(cache_key, text, vector)
+    return vector
+
+
+def _combined_query(query: str, intent: str, filters: dict) -> str:
+    """The text that is actually embedded for `query`."""
+    # The visa_type filter replaces the keyword bias; other intents keep it
+    bias = "" if "visa_type" in filters else intent_bias.get(intent, "")
+    return (bias + " " + query).strip()
+
+
+def cached_query_embedding(query: str, intent: str = "unknown"):
+    """
+    (query vector, index version) that retrieval embedded for this query,
+    read from the embedding cache — never embeds anything itself.
+    (None, None) when there is no build, or when retrieval answered from
+    the lexical fast path and so never needed a vector.
+    """
+    snapshot = _snapshot
+    if snapshot is None:
+        return None, None
+    combined_query = _combined_query(query, intent, detect_filters(query, intent))
+    vector = retrieval_cache.peek_embedding(_embedding_key(snapshot.model, snapshot.dimensions), combined_query)
+    return (vector, snapshot.version) if vector is not None else (None, None)
 
 
 # ----------------------------------------------------
 # 🔍 Context Retrieval
 # ----------------------------------------------------
-def get_context_for_query(query: str, intent: str = "unknown", k: int = 3):
+def search_chunks(
+    query: str,
+    intent: str = "unknown",
+    k: int = 3,
+    filters: dict | None = None,
+    snapshot: RAGSnapshot | None = None,
+) -> list[int]:
+    """
+    Top-k chunk IDs for `query`, restricted by metadata `filters`
+    ({"country": "uk", "visa_type": "student_visa", "language": ..., "source": ...}).
+    Without explicit filters they are derived from the intent and the
+    countries named in the query. If the filtered subset can't fill k
+    slots, visa_type is relaxed first; the search only goes unfiltered
+    when the filters match nothing at all (see rag/filters.py).
+    """
+    snapshot = snapshot or _snapshot
+    if snapshot is None:
+        return []
+    if filters is None:
+        filters = detect_filters(query, intent)
+
+    combined_query = _combined_query(query, intent, filters)
+    candidates = max(k * CANDIDATES_PER_K, 10)
+    terms = len(query_terms(query))
+
+    ids, vector = [], None
+    for step in relaxations(filters):
+        if not step and ids and filters:
+            break  # fewer on-topic chunks beat off-topic filler
+        allowed = snapshot.metadata.select(step) if step else None
+        if allowed is not None and not len(allowed):
+            continue
+        lexical_hits, coverage = snapshot.lexical.search(query, candidates, allowed)
+
+        if LEXICAL_FASTPATH and is_confident(lexical_hits, coverage, LEXICAL_MARGIN, terms):
+            # Unambiguous keyword match — no embedding round trip
+            found = [chunk_id for chunk_id, _ in lexical_hits[:k]]
+            retrieval_cache.count("lexical_fastpath")
+        else:
+            if vector is None:
+                # Get embedding (same model as the build) once for all steps
+                vector = np.array([get_embedding(combined_query, snapshot.model, snapshot.dimensions)])
+                if uses_inner_product(snapshot.index):
+                    vector = normalize(vector)  # cosine indexes store unit vectors
+            params = search_params(snapshot.index, allowed) if allowed is not None else None
+            shortlist = candidates * RERANK_FACTOR if snapshot.vectors is not None else candidates
+            D, I = snapshot.index.search(vector, shortlist, params=params)
+            vector_ids = [int(i) for i in I[0] if i >= 0]
+            if snapshot.vectors is not None:
+                # Compressed codes pick the shortlist; exact cosine orders it
+                vector_ids = snapshot.vectors.rerank(vector[0], vector_ids)[:candidates]
+            found = rrf_fuse(vector_ids, [chunk_id for chunk_id, _ in lexical_hits], k=k)
+            retrieval_cache.count("hybrid_searches")
+
+        ids += [chunk_id for chunk_id in found if chunk_id not in ids]
+        if len(ids) >= k:
+            break
+        if step:
+            retrieval_cache.count("filter_relaxations")
+    return ids[:k]
+
+
+def get_context_for_query(query: str, intent: str = "unknown", k: int = 3, filters: dict | None = None):
     """
-    Retrieve the top-k relevant text chunks using FAISS,
-    with biasing based on detected intent.
+    Retrieve the top-k relevant text chunks: BM25 and FAISS results fused
+    by reciprocal rank, or BM25 alone when its best match is unambiguous,
+    both restricted to chunks matching the metadata filters.
     Falls back to GPT reasoning when no index or results exist.
     """
-    if not index or not all_texts:
+    _maybe_reload()
+    snapshot = _snapshot  # one consistent build for the whole request
+
+    if snapshot is None or not snapshot.index.ntotal:
         print("⚠️ No FAISS index or text data — returning minimal context.")
         return f"No structured data found. The user asked: {query}"
 
-    # Apply bias keywords depending on the detected intent
-    bias = intent_bias.get(intent, "")
-    combined_query = (bias + " " + query).strip()
+    if filters is None:
+        filters = detect_filters(query, intent)
+    cache_intent = f"{intent}|{sorted(filters.items())}"
 
-    # Get embedding and search FAISS index
-    vector = get_embedding(combined_query)
-    D, I = index.search(np.array([vector]), k)
+    results = retrieval_cache.get_results(query, cache_intent, k, snapshot.version)
+    if results is None:
+        ids = search_chunks(query, intent, k, filters, snapshot)
 
-    # Collect matched text chunks
-    results = [all_texts[i] for i in I[0] if i < len(all_texts)]
+        # Collect matched text chunks
+        results = [text for text in (snapshot.store.get(i) for i in ids) if text]
+        retrieval_cache.put_results(query, cache_intent, k, snapshot.version, results)
 
     if not results:
         print(f"⚠️ No RAG matches found for '{intent}' — GPT will reason freely.")
         return f"No direct matches found. The user asked: {query}"
 
-    print(f"🧩 Retrieved {len(results)} chunks for intent '{intent}'")
+    print(f"🧩 Retrieved {len(results)} chunks for intent '{intent}' {filters or ''}")
     return "\n\n".join(results)
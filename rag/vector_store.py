@@ -0,0 +1,63 @@
+# rag/vector_store.py
+"""
+Full-precision vectors for reranking, addressed by FAISS vector ID.
+
+Builds whose index stores lossy codes (float16 / int8 scalar quantizer,
+PQ — see rag/index_factory.py) ship a `<name>.vectors` .npy file next to
+the index: row `id` is the L2-normalized float32 embedding of chunk `id`.
+The index produces a wider shortlist from its compact codes and the
+retriever reorders it by exact cosine from this file.
+
+The file is memory-mapped read-only, so only the rows of shortlisted
+chunks are ever paged in and every worker shares them in the page cache;
+resident index memory stays at the size of the compact codes.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Lossy builds: the index shortlists this many times more candidates for the rerank
+RERANK_FACTOR = int(os.getenv("NIKA_RERANK_FACTOR", "3"))
+
+
+def vectors_path(index_path) -> Path:
+    return Path(index_path).with_suffix(".vectors")
+
+
+def write_vectors(index_path, ids, vectors: np.ndarray):
+    """Write normalized `vectors` (row i belongs to ids[i]) next to `index_path`."""
+    ids = np.asarray(ids, dtype="int64")
+    vectors = np.asarray(vectors, dtype="float32")
+    table = np.zeros(((int(ids.max()) + 1) if len(ids) else 0, vectors.shape[1]), dtype="float32")
+    table[ids] = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    path = vectors_path(index_path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, path)
+
+
+def rerank(query: np.ndarray, ids: list[int], vectors: np.ndarray) -> list[int]:
+    """`ids` reordered by exact inner product with the (normalized) query."""
+    if not ids:
+        return []
+    scores = np.asarray(vectors[np.asarray(ids, dtype="int64")], dtype="float32") @ np.asarray(query, dtype="float32").ravel()
+    return [ids[i] for i in np.argsort(-scores, kind="stable")]
+
+
+class VectorStore:
+    def __init__(self, index_path):
+        self._vectors = np.load(vectors_path(index_path), mmap_mode="r")
+
+    @property
+    def dimensions(self) -> int:
+        return int(self._vectors.shape[1])
+
+    def __len__(self) -> int:
+        return int(self._vectors.shape[0])
+
+    def rerank(self, query: np.ndarray, ids: list[int]) -> list[int]:
+        return rerank(query, [i for i in ids if 0 <= i < len(self)], self._vectors)
@@ -1,12 +1,34 @@
-from fastapi import APIRouter
-from fastapi.responses import FileResponse, JSONResponse
-import os
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+
+from utils.audio_store import audio_store
+from utils.text_to_speech import AUDIO_MIME_TYPES
 
 router = APIRouter()
 
-@router.get("/static/uploads/{filename}")
-async def get_audio(filename: str):
-    path = os.path.join("static", "uploads", filename)
-    if not os.path.exists(path):
+@router.get("/audio/{clip_id}")
+async def get_audio(request: Request, clip_id: str):
+    """
+    Serve a reply clip from the audio store.
+    FileResponse handles Range requests and ETag / Last-Modified headers,
+    and hands the file to the server's sendfile path when it supports it.
+    """
+    found = await asyncio.to_thread(audio_store.open, clip_id)  # stat + utime → off the event loop
+    if not found:
         return JSONResponse({"error": "file not found"}, status_code=404)
-    return FileResponse(path, media_type="audio/ogg")
+
+    path, st = found
+    fmt = clip_id.rsplit(".", 1)[-1]
+    response = FileResponse(
+        path,
+        media_type=AUDIO_MIME_TYPES.get(fmt, "application/octet-stream"),
+        stat_result=st,
+        headers={"Cache-Control": f"private, max-age={audio_store.ttl}"},
+    )
+
+    # Clip ids are never reused, so a matching ETag means the browser's copy is current
+    if request.headers.get("if-none-match") == response.headers.get("etag"):
+        return Response(status_code=304, headers={"ETag": response.headers["etag"]})
+    return response
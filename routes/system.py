@@ -1,7 +1,25 @@
 from fastapi import APIRouter
 
+from utils.audio_pool import audio_pool_stats
+from utils.tts_cache import tts_cache
+from utils.audio_store import audio_store
+from rag.retrieval_cache import retrieval_cache
+from utils.answer_cache import answer_cache
+from utils.nika_logic import turn_stage_stats
+
 router = APIRouter()
 
 @router.get("/ping")
 def ping():
     return {"status": "ok", "message": "Nika Visa Walkie-Talkie active"}
+
+@router.get("/metrics")
+def metrics():
+    return {
+        "audio_pool": audio_pool_stats(),
+        "tts_cache": tts_cache.snapshot(),
+        "audio_store": audio_store.snapshot(),
+        "rag_cache": retrieval_cache.snapshot(),
+        "answer_cache": answer_cache.snapshot(),
+        "turn_stages": turn_stage_stats(),
+    }
@@ -1,88 +1,150 @@
 from fastapi import APIRouter, Request, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import date
-import os
-import uuid
+import asyncio
 
 from auth.routes_supabase import supabase
 from aiocache import Cache
 from utils.openai_client import log
-from utils.audio_converter import convert_to_wav
-from utils.speech_to_text import transcribe_audio
-from utils.text_to_speech import speak_reply
+from utils.audio_converter import decode_to_pcm, pcm_to_stt_wav
+from utils.vad import VAD_SAMPLE_RATE
+from utils.audio_pool import run_audio_job, AudioPoolBusy
+from utils.speech_to_text import transcribe_wav_bytes, transcribe_long, LONG_AUDIO_MS
+from utils.stt_backends import get_stt_backend
+from utils.text_to_speech import synthesize_speech, stream_speech, AUDIO_MIME_TYPES
+from utils.audio_store import audio_store
 from utils.nika_logic import gpt_reply
 
 cache = Cache()
 router = APIRouter()
 
+# ----------------------------------------------------
+# 🚦 Guest / tier turn limits (shared by HTTP + WebSocket)
+# ----------------------------------------------------
+async def check_turn_limits(user_email: str | None, client_host: str):
+    """
+    Count one voice turn against the caller's quota.
+    Returns None when the turn is allowed, otherwise an error payload.
+    """
+    # 1️⃣ Guest restrictions
+    if not user_email:
+        key = f"anon_{client_host}"
+        count = await cache.get(key) or 0
+        count += 1
+        await cache.set(key, count)
+        if count > 5:
+            return {"error": "demo_limit", "message": "Free guest limit reached. Please log in."}
+        return None
+
+    # 2️⃣ Logged in → tier logic
+    today = str(date.today())
+    profile = supabase.table("profiles").select("*").eq("email", user_email).execute()
+    if not profile.data:
+        supabase.table("profiles").insert({
+            "email": user_email,
+            "tier": "free",
+            "turns_today": 0,
+            "last_used": today
+        }).execute()
+        tier = "free"
+        turns = 0
+        last_used = today
+    else:
+        p = profile.data[0]
+        tier = p.get("tier", "free")
+        turns = p.get("turns_today", 0)
+        last_used = p.get("last_used")
+
+    if last_used != today:
+        turns = 0
+        supabase.table("profiles").update(
+            {"turns_today": 0, "last_used": today}
+        ).eq("email", user_email).execute()
+
+    LIMITS = {"free": 10, "pro": 25}
+    if turns >= LIMITS.get(tier, 10):
+        return {"error": "limit_reached", "tier": tier,
+                "message": "Daily limit reached. Upgrade for more."}
+
+    supabase.table("profiles").update(
+        {"turns_today": turns + 1}
+    ).eq("email", user_email).execute()
+    return None
+
+
+# Format for streamed replies: MP3 can be appended to a MediaSource buffer
+STREAM_TTS_FORMAT = "mp3"
+# Format for stored reply clips served from /audio/{clip_id}
+REPLY_TTS_FORMAT = "mp3"
+
+
+async def _stream_reply_audio(reply: str, speech_ms: int):
+    """
+    Chunked audio response that forwards TTS bytes as they arrive.
+    The first chunk is awaited up front so a TTS failure still gets a
+    proper error status instead of a broken 200.
+    """
+    chunks = stream_speech(reply, STREAM_TTS_FORMAT)
+    try:
+        first = await chunks.__anext__()
+    except Exception as e:
+        log("❌ TTS", f"Streaming synthesis failed: {e}", level="error")
+        return JSONResponse({"error": "tts_failed"}, status_code=502)
+
+    async def body():
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            log("❌ TTS", f"Stream interrupted: {e}", level="error")
+
+    return StreamingResponse(
+        body(),
+        media_type=AUDIO_MIME_TYPES[STREAM_TTS_FORMAT],
+        headers={"X-Speech-Ms": str(speech_ms), "Cache-Control": "no-store"},
+    )
+
+
 @router.post("/voice-upload")
-async def voice_upload(request: Request, file: UploadFile):
+async def voice_upload(request: Request, file: UploadFile, stt: str | None = None, stream: bool = False):
+    # Optional per-request STT engine override (?stt=openai|local)
+    try:
+        engine = get_stt_backend(stt)
+    except ValueError as e:
+        return JSONResponse({"error": "invalid_stt", "message": str(e)}, status_code=400)
+
+    user_email = request.cookies.get("user_email")
+    limit_error = await check_turn_limits(user_email, request.client.host)
+    if limit_error:
+        return JSONResponse(limit_error, status_code=401)
+
+    # Processing STT → GPT → TTS
+    input_bytes = await file.read()
     try:
-        user_email = request.cookies.get("user_email")
-
-        # 1️⃣ Guest restrictions
-        if not user_email:
-            key = f"anon_{request.client.host}"
-            count = await cache.get(key) or 0
-            count += 1
-            await cache.set(key, count)
-            if count > 5:
-                return JSONResponse(
-                    {"error": "demo_limit", "message": "Free guest limit reached. Please log in."},
-                    status_code=401
-                )
-
-        # 2️⃣ Logged in → tier logic
+        # Decoded once: the PCM feeds both the short and the long path
+        pcm = await run_audio_job(
+            decode_to_pcm, input_bytes, mime_type=file.content_type, sample_rate=VAD_SAMPLE_RATE
+        )
+        wav_bytes, speech_ms = await run_audio_job(pcm_to_stt_wav, pcm, engine.sample_rate)
+        if speech_ms > LONG_AUDIO_MS:
+            # Long voice notes → parallel VAD-bounded chunks (chunk encoding uses the pool too)
+            text = await transcribe_long(pcm, backend=engine)
         else:
-            profile = supabase.table("profiles").select("*").eq("email", user_email).execute()
-            if not profile.data:
-                supabase.table("profiles").insert({
-                    "email": user_email,
-                    "tier": "free",
-                    "turns_today": 0,
-                    "last_used": str(date.today())
-                }).execute()
-                tier = "free"
-                turns = 0
-            else:
-                p = profile.data[0]
-                tier = p.get("tier", "free")
-                turns = p.get("turns_today", 0)
-                last_used = p.get("last_used")
-
-            today = str(date.today())
-            if last_used != today:
-                turns = 0
-                supabase.table("profiles").update(
-                    {"turns_today": 0, "last_used": today}
-                ).eq("email", user_email).execute()
-
-            LIMITS = {"free": 10, "pro": 25}
-            if turns >= LIMITS.get(tier, 10):
-                return JSONResponse(
-                    {"error": "limit_reached", "tier": tier,
-                     "message": "Daily limit reached. Upgrade for more."},
-                    status_code=401
-                )
-
-            supabase.table("profiles").update(
-                {"turns_today": turns + 1}
-            ).eq("email", user_email).execute()
-
-        # Processing STT → GPT → TTS
-        input_bytes = await file.read()
-        wav_path = convert_to_wav(input_bytes, mime_type=file.content_type)
-
-        text = await transcribe_audio(wav_path)
-        reply = await gpt_reply(text)
-
-        os.makedirs("static/uploads", exist_ok=True)
-        tts_name = f"reply_{uuid.uuid4().hex}.ogg"
-        tts_path = os.path.join("static", "uploads", tts_name)
-        await speak_reply(reply, tts_path)
-
-        return JSONResponse({"audio_url": f"/{tts_path}"})
-
-    finally:
-        if "wav_path" in locals() and os.path.exists(wav_path):
-            os.remove(wav_path)
+            text = await transcribe_wav_bytes(wav_bytes, backend=engine)
+    except (AudioPoolBusy, asyncio.TimeoutError):
+        return JSONResponse({"error": "busy", "message": "Server is busy. Please try again."}, status_code=503)
+    reply = await gpt_reply(text)
+
+    # ?stream=1 → the reply audio itself is the response body (no second GET)
+    if stream:
+        return await _stream_reply_audio(reply, speech_ms)
+
+    try:
+        audio_bytes = await synthesize_speech(reply, REPLY_TTS_FORMAT)
+    except Exception as e:
+        log("❌ TTS", f"Synthesis failed: {e}", level="error")
+        return JSONResponse({"error": "tts_failed"}, status_code=502)
+
+    clip_id = await asyncio.to_thread(audio_store.save, audio_bytes, REPLY_TTS_FORMAT)
+    return JSONResponse({"audio_url": f"/audio/{clip_id}", "speech_ms": speech_ms})
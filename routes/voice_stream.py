@@ -0,0 +1,237 @@
+# routes/voice_stream.py
+"""
+Full-duplex voice session over a WebSocket.
+
+Protocol (one connection can carry many turns):
+  client → server
+    • binary frames : MediaRecorder WebM/Opus chunks while the user talks
+    • {"type": "end"} : user stopped talking → run STT → GPT → TTS
+  server → client
+    • {"type": "partial_transcript", "text": ...}  while audio is arriving
+    • {"type": "transcript", "text": ..., "speech_ms": n}  final user text
+    • {"type": "no_speech", "speech_ms": n}        nothing was said; the
+                                                   session keeps listening
+    • {"type": "token", "text": ...}               GPT reply deltas
+    • {"type": "audio", "index": n, "mime": ...}   followed by one binary
+                                                   frame with that clip
+    • {"type": "done"} / {"type": "error", ...}
+"""
+
+import os
+import json
+import asyncio
+
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from utils.openai_client import log
+from utils.audio_converter import convert_for_stt, decode_to_pcm, encode_wav, resample_pcm
+from utils.audio_pool import run_audio_job
+from utils.speech_to_text import transcribe_wav_bytes
+from utils.stt_backends import get_stt_backend, STTBackend
+from utils.vad import speech_segments, VAD_SAMPLE_RATE, PAD_MS
+from utils.text_to_speech import synthesize_speech, pop_sentences, AUDIO_MIME_TYPES
+from utils.nika_logic import gpt_reply_stream
+from routes.voice import check_turn_limits
+
+router = APIRouter()
+
+# Seconds between partial transcripts while the user talks (0 disables)
+PARTIAL_INTERVAL = float(os.getenv("NIKA_WS_PARTIAL_SECONDS", "2.0"))
+# Ogg/Opus plays natively in the browser and is the smallest TTS format
+STREAM_AUDIO_FORMAT = "opus"
+MIN_AUDIO_BYTES = 4000
+# A run of speech with no pause is cut for a partial once it is this long
+PARTIAL_MAX_MS = 15000
+
+
+async def _transcribe_buffer(data: bytes, engine: STTBackend):
+    """
+    WebM bytes → VAD-trimmed WAV → transcript from the selected engine.
+    Returns (text, speech_ms); decoding runs on the audio pool.
+    """
+    wav_bytes, speech_ms = await run_audio_job(convert_for_stt, data, sample_rate=engine.sample_rate)
+    if not wav_bytes:
+        return "", speech_ms
+    return await transcribe_wav_bytes(wav_bytes, backend=engine), speech_ms
+
+
+def _new_speech(data: bytes, offset: int, sample_rate: int):
+    """
+    Finished speech in `data` after sample `offset` (16 kHz), for partials.
+    Only segments followed by a pause are taken, so a word is never cut in
+    half; a pause-free run is cut at PARTIAL_MAX_MS. Returns (wav_bytes,
+    new_offset) — `wav_bytes` is empty when nothing new is ready.
+    """
+    pcm = decode_to_pcm(data, sample_rate=VAD_SAMPLE_RATE)[offset:]
+    segments, _ = speech_segments(pcm, VAD_SAMPLE_RATE)
+    # A segment that runs into the end of the buffer may still be growing
+    open_from = len(pcm) - VAD_SAMPLE_RATE * PAD_MS // 1000
+    closed = [(start, end) for start, end in segments if end < open_from]
+    if not closed and segments and open_from - segments[-1][0] >= VAD_SAMPLE_RATE * PARTIAL_MAX_MS // 1000:
+        closed = [(segments[-1][0], open_from)]
+    if not closed:
+        return b"", offset
+
+    speech = np.concatenate([pcm[start:end] for start, end in closed])
+    wav_bytes = encode_wav(resample_pcm(speech, VAD_SAMPLE_RATE, sample_rate), sample_rate)
+    return wav_bytes, offset + closed[-1][1]
+
+
+async def _send_partials(websocket: WebSocket, buffer: bytearray, engine: STTBackend):
+    """
+    Periodically transcribe the speech finished since the last partial and
+    send the running transcript. Each stretch of audio is transcribed once,
+    so STT cost grows with the utterance, not with its square.
+    """
+    last_size, offset, transcript = 0, 0, ""
+    while True:
+        await asyncio.sleep(PARTIAL_INTERVAL)
+        if len(buffer) <= max(last_size, MIN_AUDIO_BYTES):
+            continue
+        last_size = len(buffer)
+        try:
+            wav_bytes, offset = await run_audio_job(_new_speech, bytes(buffer), offset, engine.sample_rate)
+            if not wav_bytes:
+                continue
+            text = await transcribe_wav_bytes(wav_bytes, backend=engine)
+        except Exception:
+            continue
+        if text:
+            transcript = f"{transcript} {text}".strip()
+            await websocket.send_json({"type": "partial_transcript", "text": transcript})
+
+
+async def _receive_utterance(websocket: WebSocket, user_email: str | None, engine: STTBackend):
+    """
+    Collect audio frames until the client sends {"type": "end"}.
+    Returns the audio bytes, or None if the turn was rejected by limits.
+    """
+    buffer = bytearray()
+    partial_task = None
+    checked = False
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes"):
+                if not checked:
+                    checked = True
+                    limit_error = await check_turn_limits(user_email, websocket.client.host)
+                    if limit_error:
+                        await websocket.send_json({"type": "error", **limit_error})
+                        return None
+                    if PARTIAL_INTERVAL > 0:
+                        partial_task = asyncio.create_task(_send_partials(websocket, buffer, engine))
+                buffer.extend(message["bytes"])
+                continue
+
+            if message.get("text"):
+                try:
+                    event = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if event.get("type") == "end":
+                    return bytes(buffer)
+    finally:
+        if partial_task:
+            partial_task.cancel()
+
+
+async def _stream_reply(websocket: WebSocket, text: str):
+    """
+    Stream GPT tokens to the client and synthesize each finished sentence
+    as soon as it exists. Clips are synthesized concurrently but sent in order.
+    """
+    clips: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        pending = ""
+        try:
+            async for delta in gpt_reply_stream(text):
+                await websocket.send_json({"type": "token", "text": delta})
+                sentences, pending = pop_sentences(pending + delta)
+                for sentence in sentences:
+                    clips.put_nowait(asyncio.create_task(
+                        synthesize_speech(sentence, STREAM_AUDIO_FORMAT)
+                    ))
+            if pending.strip():
+                clips.put_nowait(asyncio.create_task(
+                    synthesize_speech(pending, STREAM_AUDIO_FORMAT)
+                ))
+        finally:
+            clips.put_nowait(None)
+
+    async def send():
+        index = 0
+        while (task := await clips.get()) is not None:
+            try:
+                audio = await task
+            except Exception as e:
+                log("⚠️ TTS", f"Sentence synthesis failed: {e}", level="warn")
+                continue
+            await websocket.send_json({
+                "type": "audio",
+                "index": index,
+                "mime": AUDIO_MIME_TYPES[STREAM_AUDIO_FORMAT],
+            })
+            await websocket.send_bytes(audio)
+            index += 1
+
+    producer = asyncio.create_task(produce())
+    try:
+        await send()
+        await producer
+    finally:
+        producer.cancel()
+        while not clips.empty():
+            task = clips.get_nowait()
+            if task is not None:
+                task.cancel()
+
+
+@router.websocket("/ws/voice")
+async def voice_stream(websocket: WebSocket):
+    await websocket.accept()
+    user_email = websocket.cookies.get("user_email")
+
+    # Optional per-session STT engine override (?stt=openai|local)
+    try:
+        engine = get_stt_backend(websocket.query_params.get("stt"))
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": "invalid_stt", "message": str(e)})
+        await websocket.close()
+        return
+
+    try:
+        while True:
+            audio = await _receive_utterance(websocket, user_email, engine)
+            if audio is None:
+                await websocket.close()
+                return
+
+            if len(audio) < MIN_AUDIO_BYTES:
+                await websocket.send_json({"type": "error", "error": "insufficient_audio"})
+                continue
+
+            try:
+                text, speech_ms = await _transcribe_buffer(audio, engine)
+            except Exception as e:
+                log("⚠️ STT", f"Stream transcription failed: {e}", level="warn")
+                await websocket.send_json({"type": "error", "error": "invalid_audio"})
+                continue
+
+            if not text:
+                # Silence or noise only — no GPT / TTS for an empty turn
+                await websocket.send_json({"type": "no_speech", "speech_ms": speech_ms})
+                continue
+
+            await websocket.send_json({"type": "transcript", "text": text, "speech_ms": speech_ms})
+            await _stream_reply(websocket, text)
+            await websocket.send_json({"type": "done"})
+
+    except WebSocketDisconnect:
+        log("🔌 WebSocket", "Voice session closed.")
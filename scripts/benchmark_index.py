@@ -0,0 +1,181 @@
+# nika_voice_ai/scripts/benchmark_index.py
+"""
+Recall vs latency vs memory benchmark for the FAISS index types.
+
+Builds every type × vector storage (float32 / float16 / int8, see
+rag/index_factory.py) over the same vectors, optionally truncated to
+fewer dimensions, and compares it with exact float32 search at full
+dimensions (the baseline):
+
+  recall@k     share of the exact top-k the index itself returns
+  +rerank      recall@k after reranking a wider shortlist against the
+               full-precision vectors (what the retriever does for lossy
+               builds; those vectors stay on disk, memory-mapped)
+  p50 / p99    single-query latency (including the rerank)
+  memory       serialized index size, and the saving vs the baseline
+  build        train + add time
+
+--dims truncates and renormalizes the vectors, which is exactly what
+`dimensions` does for text-embedding-3-* models (Matryoshka). Synthetic
+vectors aren't Matryoshka-trained, so their recall loss is pessimistic.
+
+Vectors come from the live index (default) or a synthetic clustered
+corpus, to see how settings hold up as the knowledge base grows.
+Queries are corpus vectors with noise added, so no API calls are made.
+
+Usage:
+  python -m scripts.benchmark_index
+  python -m scripts.benchmark_index --synthetic 50000 --dim 1536 --k 5
+  python -m scripts.benchmark_index --synthetic 20000 --dim 3072 --types flat,hnsw --storage float32,float16,int8 --dims 3072,1024,256
+  NIKA_HNSW_EF_SEARCH=128 NIKA_IVF_NPROBE=16 python -m scripts.benchmark_index
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from rag.index_factory import (  # noqa: E402
+    INDEX_TYPES,
+    VECTOR_STORAGES,
+    build_index,
+    index_bytes,
+    index_kind,
+    needs_rerank,
+    normalize,
+)
+from rag.manifest import build_path, read_manifest  # noqa: E402
+from rag.vector_store import RERANK_FACTOR, rerank, vectors_path  # noqa: E402
+
+
+def live_index_path() -> Path | None:
+    """Index file of the build the manifest points at, if any."""
+    manifest = read_manifest()
+    return build_path(manifest) if manifest else None
+
+
+def load_index_vectors(path: Path) -> np.ndarray:
+    if vectors_path(path).exists():
+        # Lossy builds keep full-precision rows next to the index (unused IDs are zero rows)
+        table = np.load(vectors_path(path))
+        return table[np.linalg.norm(table, axis=1) > 0]
+    index = faiss.read_index(str(path))
+    base = index.index if isinstance(index, faiss.IndexIDMap2) else index
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return base.reconstruct_n(0, base.ntotal)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 64, seed: int = 7) -> np.ndarray:
+    """Clustered Gaussian data — closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def make_queries(vectors: np.ndarray, n: int, noise: float = 0.05, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), size=n)]
+    scale = noise * np.linalg.norm(picks, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return normalize(picks + scale * rng.normal(size=picks.shape).astype("float32"))
+
+
+def time_queries(index, queries: np.ndarray, k: int, full_vectors: np.ndarray | None = None):
+    """
+    Search one query at a time (like the retriever) → (ids, reranked ids,
+    latencies in ms). With `full_vectors`, a RERANK_FACTOR× shortlist is
+    reranked exactly; otherwise reranked ids are None.
+    """
+    ids, reranked, latencies = [], [], []
+    shortlist = k * RERANK_FACTOR if full_vectors is not None else k
+    for q in queries:
+        start = time.perf_counter()
+        _, I = index.search(q[None, :], shortlist)
+        if full_vectors is not None:
+            reranked.append(rerank(q, [int(i) for i in I[0] if i >= 0], full_vectors)[:k])
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(I[0][:k])
+    return np.array(ids), (reranked if full_vectors is not None else None), np.array(latencies)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """Matryoshka-style reduction: keep the first `dims` components, renormalize."""
+    return normalize(vectors[:, :dims])
+
+
+def run(vectors: np.ndarray, k: int, n_queries: int, types: list[str], storages: list[str], dims_list: list[int]):
+    ids = np.arange(len(vectors))
+    full_dim = vectors.shape[1]
+    queries = make_queries(vectors, n_queries)
+    print(f"📐 {len(vectors)} vectors × {full_dim} dims, {n_queries} queries, k={k}, rerank shortlist {k * RERANK_FACTOR}\n")
+    print(
+        f"{'type':<10} {'built as':<10} {'storage':<8} {'dims':>5} {'recall@k':>9} {'+rerank':>8} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'memory MB':>10} {'saving':>7} {'build s':>8}"
+    )
+
+    baseline = build_index(vectors, ids, "flat", "float32")
+    truth, _, _ = time_queries(baseline, queries, k)
+    baseline_bytes = index_bytes(baseline)
+
+    for dims in dims_list or [full_dim]:
+        dim_vectors, dim_queries = truncate(vectors, dims), truncate(queries, dims)
+        for index_type in types:
+            for storage in storages:
+                if index_type == "ivf_pq" and storage != "float32":
+                    continue  # PQ codes replace the storage choice
+                start = time.perf_counter()
+                index = build_index(dim_vectors, ids, index_type, storage)
+                build_s = time.perf_counter() - start
+
+                found, reranked, latencies = time_queries(
+                    index, dim_queries, k, dim_vectors if needs_rerank(index) else None
+                )
+                size = index_bytes(index)
+                rerank_recall = f"{recall_at_k(np.array(reranked), truth):>8.3f}" if reranked is not None else f"{'—':>8}"
+                print(
+                    f"{index_type:<10} {index_kind(index):<10} {storage if index_type != 'ivf_pq' else 'pq':<8} "
+                    f"{dims:>5} {recall_at_k(found, truth):>9.3f} {rerank_recall} "
+                    f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+                    f"{size / 1e6:>10.2f} {baseline_bytes / size:>6.1f}x {build_s:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FAISS index types on recall and latency.")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of the live index")
+    parser.add_argument("--dim", type=int, default=1536, help="dimensions for --synthetic")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="comma-separated index types")
+    parser.add_argument("--storage", default=",".join(VECTOR_STORAGES), help="comma-separated vector storages")
+    parser.add_argument("--dims", default="", help="comma-separated reduced dimensions (default: full only)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    elif (index_path := live_index_path()) is not None and index_path.exists():
+        vectors = load_index_vectors(index_path)
+    else:
+        sys.exit("❌ No live index — run `python -m scripts.sync_rag_from_db` or pass --synthetic N.")
+
+    run(
+        vectors.astype("float32"),
+        args.k,
+        args.queries,
+        args.types.split(","),
+        args.storage.split(","),
+        [int(d) for d in args.dims.split(",") if d],
+    )
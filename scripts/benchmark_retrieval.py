@@ -0,0 +1,347 @@
+# nika_voice_ai/scripts/benchmark_retrieval.py
+"""
+Retrieval quality + speed benchmark with a checked-in baseline.
+
+The query set is built from
+  • data/intents/visa_intents.json   every pattern, labeled with its visa type
+  • data/visa_faq.txt                every question, labeled by the country /
+                                     visa type it names
+  • data/benchmarks/retrieval_queries.json
+                                     hand-labeled questions (EN + FA) with the
+                                     source pages that answer them
+A chunk is relevant when its chunk-store metadata matches the label
+("source" matches by prefix). Queries with no relevant chunk in the corpus
+are skipped.
+
+Every query goes through rag.retriever (filters, BM25, vectors, RRF,
+caches) exactly as in production:
+
+  recall@k    relevant chunks in the top k / min(k, relevant chunks)
+  MRR         1 / rank of the first relevant chunk
+  latency     get_context_for_query p50 / p95 / p99, cold (empty caches)
+              and warm (repeat queries)
+  QPS         cold throughput with --concurrency threads
+  memory      index size and process RSS / PSS growth for the build
+
+By default the corpus is indexed into a temporary build with the `hash`
+stand-in embedder (rag/embedders.py), so runs need no model or API and
+are reproducible. --model uses a real embedder (documents come from the
+embedding cache); --live benchmarks the published build instead.
+
+Results are compared with data/benchmarks/retrieval_baseline.json: a drop
+in recall@k or MRR fails the run (exit code 1); slower latency only warns,
+since it depends on the machine. Index type, cache or chunking changes
+should come with a fresh baseline (--save-baseline).
+
+Usage:
+  python -m scripts.benchmark_retrieval
+  python -m scripts.benchmark_retrieval --type hnsw --storage int8
+  python -m scripts.benchmark_retrieval --save-baseline
+"""
+
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from rag import retriever  # noqa: E402
+from rag.embedders import get_embedder  # noqa: E402
+from rag.embedding_cache import EmbeddingCache  # noqa: E402
+from rag.chunk_store import write_chunk_store  # noqa: E402
+from rag.vector_store import write_vectors  # noqa: E402
+from rag.filters import detect_country  # noqa: E402
+from rag.retrieval_cache import retrieval_cache  # noqa: E402
+from rag.manifest import INDEX_FILE, new_build_dir, write_manifest  # noqa: E402
+from rag.index_factory import (  # noqa: E402
+    INDEX_TYPE,
+    VECTOR_STORAGE,
+    build_index,
+    index_bytes,
+    index_kind,
+    index_storage,
+    needs_rerank,
+)
+from scripts.metadata import classify_visa_type  # noqa: E402
+from scripts.benchmark_workers import memory_mb  # noqa: E402
+from scripts.sync_rag_from_db import EMBED_CACHE_DB, chunk_metadata, collect_records  # noqa: E402
+from utils.intent_classifier import classify_intent  # noqa: E402
+
+INTENTS_JSON = PROJECT_ROOT / "data" / "intents" / "visa_intents.json"
+FAQ_TXT = PROJECT_ROOT / "data" / "visa_faq.txt"
+BENCH_DIR = PROJECT_ROOT / "data" / "benchmarks"
+CURATED_JSON = BENCH_DIR / "retrieval_queries.json"
+BASELINE_JSON = BENCH_DIR / "retrieval_baseline.json"
+
+# visa_intents.json intent names → chunk metadata visa_type
+INTENT_VISA_TYPES = {
+    "study_visa": "student_visa",
+    "startup_visa": "startup_visa",
+    "work_visa": "freelancer_visa",
+    "residence_permit": "residence_permit",
+    "family_reunion": "family_reunion",
+}
+
+QUALITY_METRICS = ("recall_at_k", "mrr")
+QUALITY_TOLERANCE = 0.005
+LATENCY_TOLERANCE = 1.5  # warn when p95 grows beyond this factor
+
+
+# -------------------------------------------------------
+# Query set
+# -------------------------------------------------------
+def load_queries() -> list[dict]:
+    """[{"query", "origin", "relevant": {field: value}}] from intents, FAQ and curated labels."""
+    queries = []
+
+    for item in json.loads(INTENTS_JSON.read_text(encoding="utf-8")):
+        visa_type = INTENT_VISA_TYPES.get(item["intent"])
+        for pattern in item.get("patterns", []) if visa_type else []:
+            queries.append({"query": pattern, "origin": "intents", "relevant": {"visa_type": visa_type}})
+
+    for line in FAQ_TXT.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line.endswith("?"):
+            continue
+        relevant = {"country": detect_country(line), "visa_type": classify_visa_type(line)}
+        relevant = {k: v for k, v in relevant.items() if v and v != "unknown"}
+        if relevant:
+            queries.append({"query": line, "origin": "faq", "relevant": relevant})
+
+    if CURATED_JSON.exists():
+        for item in json.loads(CURATED_JSON.read_text(encoding="utf-8")):
+            queries.append({"origin": "curated", **item})
+    return queries
+
+
+def is_relevant(meta: dict, relevant: dict) -> bool:
+    for field, wanted in relevant.items():
+        wanted = [wanted] if isinstance(wanted, str) else wanted
+        value = meta.get(field) or ""
+        if field == "source":
+            if not any(value.startswith(w) for w in wanted):
+                return False
+        elif value not in wanted:
+            return False
+    return True
+
+
+def relevant_ids(snapshot, relevant: dict) -> set[int]:
+    return {
+        int(i) for i in snapshot.store.ids()
+        if is_relevant(snapshot.store.metadata(i) or {}, relevant)
+    }
+
+
+# -------------------------------------------------------
+# Benchmark build
+# -------------------------------------------------------
+def build_snapshot(model: str, index_type: str, storage: str, directory: Path):
+    """Index the whole corpus into a throwaway build and load it like the retriever does."""
+    records = collect_records()
+    keys = list(records)
+    embedder = get_embedder(model)
+
+    cache = EmbeddingCache(EMBED_CACHE_DB) if embedder.name != "hash" else None
+    try:
+        vectors = asyncio.run(embedder.embed_documents([records[key] for key in keys], cache=cache))
+    finally:
+        if cache:
+            cache.close()
+
+    ids = np.arange(len(keys))
+    index = build_index(vectors, ids, index_type, storage)
+    version, build_dir = new_build_dir(directory / "builds")
+    index_path = build_dir / INDEX_FILE
+    write_chunk_store(index_path, {int(i): (records[key], chunk_metadata(key, records[key])) for i, key in zip(ids, keys)})
+    faiss.write_index(index, str(index_path))
+    if needs_rerank(index):
+        write_vectors(index_path, ids, vectors)
+
+    manifest_path = directory / "manifest.json"
+    write_manifest(
+        version,
+        build_dir,
+        model=embedder.model,
+        dimensions=index.d,
+        count=index.ntotal,
+        index_type=index_kind(index),
+        storage=index_storage(index),
+        manifest_path=manifest_path,
+    )
+    return retriever.load_snapshot(manifest_path)
+
+
+# -------------------------------------------------------
+# Measurements
+# -------------------------------------------------------
+def percentiles(latencies: list[float]) -> dict:
+    return {f"p{p}_ms": round(float(np.percentile(latencies, p)), 3) for p in (50, 95, 99)}
+
+
+def time_queries(queries: list[dict], k: int) -> list[float]:
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        retriever.get_context_for_query(q["query"], q["intent"], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def throughput(queries: list[dict], k: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda q: retriever.get_context_for_query(q["query"], q["intent"], k), queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def run(args) -> dict:
+    before = memory_mb()
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.live:
+        snapshot = retriever.current_snapshot()
+        if snapshot is None:
+            sys.exit("❌ No published build — run `python -m scripts.sync_rag_from_db` or drop --live.")
+    else:
+        snapshot = build_snapshot(args.model, args.type, args.storage, Path(tmpdir.name))
+        retriever.pin_snapshot(snapshot)
+    after = memory_mb()
+
+    queries, skipped = [], 0
+    for q in load_queries():
+        q["relevant_ids"] = relevant_ids(snapshot, q["relevant"])
+        if not q["relevant_ids"]:
+            skipped += 1
+            continue
+        q["intent"] = classify_intent(q["query"])
+        queries.append(q)
+    if not queries:
+        sys.exit("❌ No query has a relevant chunk in this corpus.")
+
+    # Quality: the ranked chunk IDs behind get_context_for_query
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        for q in queries:
+            ranked = retriever.search_chunks(q["query"], q["intent"], args.k, snapshot=snapshot)
+            hits = [rank for rank, chunk_id in enumerate(ranked) if chunk_id in q["relevant_ids"]]
+            q["recall"] = len(hits) / min(args.k, len(q["relevant_ids"]))
+            q["rr"] = 1.0 / (hits[0] + 1) if hits else 0.0
+
+        # Speed: end to end through the caches
+        retrieval_cache.clear()
+        cold = time_queries(queries, args.k)
+        warm = time_queries(queries, args.k)
+        retrieval_cache.clear()
+        qps = throughput(queries, args.k, args.concurrency)
+
+    by_origin = {}
+    for origin in sorted({q["origin"] for q in queries}):
+        group = [q for q in queries if q["origin"] == origin]
+        by_origin[origin] = {
+            "queries": len(group),
+            "recall_at_k": round(float(np.mean([q["recall"] for q in group])), 4),
+            "mrr": round(float(np.mean([q["rr"] for q in group])), 4),
+        }
+
+    tmpdir.cleanup()
+    return {
+        "config": {
+            "model": snapshot.model,
+            "index_type": index_kind(snapshot.index),
+            "storage": index_storage(snapshot.index),
+            "k": args.k,
+            "chunks": int(snapshot.index.ntotal),
+            "queries": len(queries),
+            "live": bool(args.live),
+        },
+        "metrics": {
+            "recall_at_k": round(float(np.mean([q["recall"] for q in queries])), 4),
+            "mrr": round(float(np.mean([q["rr"] for q in queries])), 4),
+            "cold": percentiles(cold),
+            "warm": percentiles(warm),
+            "qps": round(qps, 1),
+            "concurrency": args.concurrency,
+            "index_mb": round(index_bytes(snapshot.index) / 1e6, 3),
+            "rss_mb": round(after["rss"] - before["rss"], 1),
+            "pss_mb": round(after["pss"] - before["pss"], 1),
+        },
+        "by_origin": by_origin,
+        "skipped_queries": skipped,
+    }
+
+
+# -------------------------------------------------------
+# Report + baseline
+# -------------------------------------------------------
+def report(result: dict):
+    c, m = result["config"], result["metrics"]
+    print(
+        f"\n📐 {c['chunks']} chunks, {c['queries']} queries ({result['skipped_queries']} skipped), "
+        f"k={c['k']}, {c['model']}, {c['index_type']}/{c['storage']}{' (live build)' if c['live'] else ''}\n"
+    )
+    print(f"{'origin':<10} {'queries':>8} {'recall@k':>9} {'MRR':>7}")
+    for origin, g in result["by_origin"].items():
+        print(f"{origin:<10} {g['queries']:>8} {g['recall_at_k']:>9.3f} {g['mrr']:>7.3f}")
+    print(f"{'all':<10} {c['queries']:>8} {m['recall_at_k']:>9.3f} {m['mrr']:>7.3f}\n")
+    for phase in ("cold", "warm"):
+        p = m[phase]
+        print(f"⏱️  {phase:<5} p50 {p['p50_ms']:.2f} ms · p95 {p['p95_ms']:.2f} ms · p99 {p['p99_ms']:.2f} ms")
+    print(f"🚀 {m['qps']:.0f} QPS cold with {m['concurrency']} threads")
+    print(f"💾 index {m['index_mb']:.2f} MB · RSS +{m['rss_mb']:.1f} MB · PSS +{m['pss_mb']:.1f} MB")
+
+
+def compare(result: dict, baseline: dict) -> bool:
+    """Print the differences from the baseline; False on a quality regression."""
+    if baseline["config"] != result["config"]:
+        print(f"\n⚠️ Baseline was recorded with a different setup: {baseline['config']}")
+        return True
+
+    ok = True
+    print("\n📊 vs baseline:")
+    for metric in QUALITY_METRICS:
+        old, new = baseline["metrics"][metric], result["metrics"][metric]
+        regressed = new < old - QUALITY_TOLERANCE
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {metric}: {old:.4f} → {new:.4f} ({new - old:+.4f})")
+    for phase in ("cold", "warm"):
+        old, new = baseline["metrics"][phase]["p95_ms"], result["metrics"][phase]["p95_ms"]
+        slower = old and new > old * LATENCY_TOLERANCE
+        print(f"   {'⚠️' if slower else '✅'} {phase} p95: {old:.2f} → {new:.2f} ms")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency against a baseline.")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--model", default="hash:512", help="embedder for the benchmark build (default: offline hash)")
+    parser.add_argument("--type", default=INDEX_TYPE, help="index type for the benchmark build")
+    parser.add_argument("--storage", default=VECTOR_STORAGE, help="vector storage for the benchmark build")
+    parser.add_argument("--live", action="store_true", help="benchmark the published build instead")
+    parser.add_argument("--concurrency", type=int, default=4, help="threads for the QPS run")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_JSON)
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the new baseline")
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\n💾 Baseline saved to {args.baseline}")
+    elif args.baseline.exists():
+        if not compare(result, json.loads(args.baseline.read_text(encoding="utf-8"))):
+            sys.exit(1)
+    else:
+        print(f"\nℹ️ No baseline at {args.baseline} — run with --save-baseline to record one.")
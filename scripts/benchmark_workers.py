@@ -0,0 +1,125 @@
+# nika_voice_ai/scripts/benchmark_workers.py
+"""
+Per-worker memory of the RAG index as the worker count grows.
+
+Multi-worker launch (Procfile):
+    WEB_CONCURRENCY=4 uvicorn main:app --workers ${WEB_CONCURRENCY:-1}
+Each worker loads the current build itself. With NIKA_RAG_MMAP=1 (the
+default) flat and IVF indexes and the chunk store are memory-mapped
+read-only, so their pages live once in the page cache and are shared by
+every worker; HNSW graphs can't be mapped and stay private per worker.
+
+This script starts N spawned processes (like uvicorn workers), loads the
+index in each, runs a few searches, and — while all N are alive — reads
+/proc/self/smaps_rollup. RSS counts shared pages in every process; PSS
+splits them between the sharers, so PSS × N is the real total.
+
+Usage:
+  python -m scripts.benchmark_workers                       # current build
+  python -m scripts.benchmark_workers --synthetic 100000 --dim 1536 --type flat
+  python -m scripts.benchmark_workers --workers 1,2,4,8 --no-mmap
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+
+def memory_mb() -> dict:
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+    usage = {"rss": 0.0, "pss": 0.0, "private": 0.0}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in fields:
+                usage[fields[name]] += int(rest.split()[0]) / 1024
+    return usage
+
+
+def worker(index_path: str, index_type: str, mmap: bool, ready, done, results):
+    from rag.index_factory import read_index, configure_search
+    from rag.chunk_store import ChunkStore, store_paths
+
+    before = memory_mb()
+    index = configure_search(read_index(index_path, index_type, mmap=mmap))
+    store = ChunkStore(index_path) if store_paths(index_path)[1].exists() else None
+
+    # Touch the data like real traffic would
+    rng = np.random.default_rng(os.getpid())
+    _, ids = index.search(rng.normal(size=(32, index.d)).astype("float32"), 3)
+    if store is not None:
+        for i in ids.ravel():
+            store.get(i)
+
+    ready.wait()  # measure only while every worker is alive
+    after = memory_mb()
+    results.put({k: after[k] - before.get(k, 0) for k in after})
+    done.wait()
+
+
+def measure(index_path: str, index_type: str, workers: int, mmap: bool) -> list[dict]:
+    ctx = mp.get_context("spawn")
+    ready, done, results = ctx.Barrier(workers + 1), ctx.Barrier(workers + 1), ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(index_path, index_type, mmap, ready, done, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    ready.wait()
+    samples = [results.get() for _ in procs]
+    done.wait()
+    for p in procs:
+        p.join()
+    return samples
+
+
+def synthetic_index(n: int, dim: int, index_type: str, directory: str) -> str:
+    import faiss
+    from rag.index_factory import build_index
+    from rag.chunk_store import write_chunk_store
+
+    vectors = np.random.default_rng(3).normal(size=(n, dim)).astype("float32")
+    path = Path(directory) / "bench.faiss"
+    faiss.write_index(build_index(vectors, np.arange(n), index_type), str(path))
+    write_chunk_store(path, {i: (f"synthetic chunk {i} " * 40, {}) for i in range(n)})
+    return str(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker RSS/PSS of the RAG index.")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N synthetic vectors instead")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--type", default="flat", help="index type for --synthetic")
+    parser.add_argument("--no-mmap", action="store_true", help="read the index into private memory")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.synthetic:
+        index_path, index_type = synthetic_index(args.synthetic, args.dim, args.type, tmpdir.name), args.type
+    else:
+        from rag.manifest import read_manifest, build_path
+
+        manifest = read_manifest()
+        if manifest is None:
+            sys.exit("❌ No index manifest — run `python -m scripts.sync_rag_from_db` or pass --synthetic N.")
+        index_path, index_type = str(build_path(manifest)), manifest.get("index_type", "")
+
+    mmap = not args.no_mmap
+    size_mb = os.path.getsize(index_path) / 1e6
+    print(f"📐 {index_type} index, {size_mb:.1f} MB on disk, mmap={'on' if mmap else 'off'}\n")
+    print(f"{'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15} {'total PSS':>10}  (MB)")
+    for n in [int(w) for w in args.workers.split(",")]:
+        samples = measure(index_path, index_type, n, mmap)
+        avg = {k: sum(s[k] for s in samples) / n for k in samples[0]}
+        print(f"{n:>7} {avg['rss']:>11.1f} {avg['pss']:>11.1f} {avg['private']:>15.1f} {avg['pss'] * n:>10.1f}")
+    tmpdir.cleanup()
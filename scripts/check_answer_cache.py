@@ -0,0 +1,93 @@
+# nika_voice_ai/scripts/check_answer_cache.py
+"""
+End-to-end check for the semantic answer cache (utils/answer_cache.py).
+
+Runs real general-Q&A turns through `gpt_reply` — session, mode detection,
+memory, RAG and the answer cache — against a throwaway hash-embedder build,
+with the chat model swapped for a stub that counts its calls:
+
+  1. user A's first general question is answered by the model and stored;
+  2. user B asks a paraphrase and gets the stored answer without a model call;
+  3. user A's follow-up (generated with A's conversation memory) is not stored.
+
+Exits 1 when any step fails.
+
+Usage:
+  python -m scripts.check_answer_cache
+"""
+
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+from scripts.benchmark_retrieval import build_snapshot  # noqa: E402
+from rag import retriever  # noqa: E402
+from utils import nika_logic  # noqa: E402
+from utils.answer_cache import answer_cache  # noqa: E402
+
+QUESTION = "What is the blocked account amount for a German student visa?"
+PARAPHRASE = "For a German student visa, what is the amount of the blocked account?"
+FOLLOW_UP = "And how long does the embassy appointment take for that?"
+
+
+class StubCompletions:
+    """Stands in for `client.chat.completions`; every call is a fresh answer."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"Stub answer #{self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+async def turn(user_id: str, text: str) -> str:
+    reply = await nika_logic.gpt_reply(text, user_id=user_id)
+    print(f"   {user_id}: {text!r} → {reply!r}")
+    return reply
+
+
+async def main() -> list[str]:
+    completions = StubCompletions()
+    nika_logic.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    answer_cache.purge()
+    failures = []
+
+    # First contact only gets the greeting
+    await turn("user_a", "hi")
+    await turn("user_b", "hello")
+
+    stored_before = answer_cache.stats["stores"]
+    first = await turn("user_a", QUESTION)
+    if answer_cache.stats["stores"] != stored_before + 1:
+        failures.append("first general question was not stored")
+
+    calls_before = completions.calls
+    served = await turn("user_b", PARAPHRASE)
+    if completions.calls != calls_before or served != first:
+        failures.append("paraphrase was not served from the answer cache")
+
+    stored_before = answer_cache.stats["stores"]
+    await turn("user_a", FOLLOW_UP)
+    if answer_cache.stats["stores"] != stored_before:
+        failures.append("answer generated with conversation memory was stored")
+    return failures
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        retriever.pin_snapshot(build_snapshot("hash:512", "flat", "float32", Path(directory)))
+        failures = asyncio.run(main())
+
+    print(f"\n📊 {answer_cache.snapshot()}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Answer cache stores memory-free answers and serves paraphrases.")
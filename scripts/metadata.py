@@ -1,21 +1,81 @@
+import re
 from pathlib import Path
 
-def extract_metadata(file_path: Path):
+# Top-level domain / country name → canonical country
+COUNTRY_BY_TLD = {"uk": "uk", "fi": "finland", "se": "sweden", "nl": "netherlands", "de": "germany"}
+COUNTRY_NAMES = {
+    "united kingdom": "uk",
+    "uk": "uk",
+    "england": "uk",
+    "finland": "finland",
+    "sweden": "sweden",
+    "netherlands": "netherlands",
+    "holland": "netherlands",
+    "germany": "germany",
+}
+
+# First match wins; values follow the intent names used by the retriever
+VISA_KEYWORDS = [
+    ("startup", "startup_visa"),
+    ("freelanc", "freelancer_visa"),
+    ("self-employed", "freelancer_visa"),
+    ("visitor", "visitor_visa"),
+    ("tourist", "visitor_visa"),
+    ("family", "family_reunion"),
+    ("student", "student_visa"),
+    ("study", "student_visa"),
+    ("admission", "student_visa"),
+    ("scholarship", "student_visa"),
+    ("doctoral", "student_visa"),
+    ("phd", "student_visa"),
+    ("residence", "residence_permit"),
+    ("work", "freelancer_visa"),
+]
+
+PERSIAN_CHARS = re.compile(r"[؀-ۿ]")
+LANG_SUFFIX = re.compile(r"_([a-z]{2})(?:_chunk\d+)?$")
+
+
+def normalize_country(text: str) -> str:
+    text = (text or "").strip().lower()
+    if text in COUNTRY_NAMES:
+        return COUNTRY_NAMES[text]
+    domain = text.split("_")[0]
+    tld = domain.rsplit(".", 1)[-1] if "." in domain else ""
+    return COUNTRY_BY_TLD.get(tld, "unknown")
+
+
+def classify_visa_type(*texts: str) -> str:
+    """Visa type from the first text (name, folder, ...) that mentions one."""
+    for text in texts:
+        text = (text or "").lower()
+        for keyword, visa_type in VISA_KEYWORDS:
+            if keyword in text:
+                return visa_type
+    return "unknown"
+
+
+def detect_language(name: str, text: str = "") -> str:
+    match = LANG_SUFFIX.search(name.lower())
+    if match:
+        return match.group(1)
+    return "fa" if PERSIAN_CHARS.search(text[:500]) else "en"
+
+
+def extract_metadata(file_path: Path, text: str = ""):
     name = file_path.stem.lower()
 
-    # detect country
-    country = name.split("_")[0]
+    # detect country (from the source domain, then the folder name)
+    country = normalize_country(name)
+    if country == "unknown":
+        country = normalize_country(file_path.parent.name.split("_")[0])
 
     # detect visa type
-    visa_type = "unknown"
-    if "study" in name: visa_type = "study"
-    if "startup" in name: visa_type = "startup"
-    if "work" in name: visa_type = "work"
-    if "residence" in name: visa_type = "residence"
-    if "family" in name: visa_type = "family"
+    visa_type = classify_visa_type(name, file_path.parent.name)
 
     return {
         "country": country,
         "visa_type": visa_type,
-        "source": file_path.name
+        "source": file_path.name,
+        "language": detect_language(name, text),
     }
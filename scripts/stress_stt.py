@@ -0,0 +1,152 @@
+# nika_voice_ai/scripts/stress_stt.py
+"""
+Concurrency stress check for the STT preprocessing path.
+
+Runs N voice turns at once, each with distinct audio, through the same
+decode → resample → (chunk) → transcribe code the routes use, and checks
+that every transcript belongs to its own input.
+
+  offline (default): each turn is a WebM/Opus tone at its own frequency;
+                     the Whisper client is swapped for a local fingerprint
+                     that "transcribes" the dominant frequency.
+  --live:            each turn is TTS audio of a distinct number, sent to
+                     the real Whisper API.
+
+Usage:
+  python -m scripts.stress_stt --turns 32
+  python -m scripts.stress_stt --turns 8 --live
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from types import SimpleNamespace
+
+import av
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+
+# -------------------------------------------------------
+# Offline fixtures
+# -------------------------------------------------------
+def tone_webm(freq: float, seconds: float = 2.0, rate: int = 48000) -> bytes:
+    """
+    Encode a voiced, speech-like tone (harmonics + syllable envelope, with
+    silence before and after) as WebM/Opus, like a MediaRecorder upload.
+    `freq` is the fundamental, so it stays the dominant frequency.
+    """
+    buffer = io.BytesIO()
+    out = av.open(buffer, "w", format="webm")
+    stream = out.add_stream("libopus", rate=rate)
+    stream.layout = "mono"
+
+    t = np.arange(int(rate * seconds)) / rate
+    voiced = sum(np.sin(2 * np.pi * freq * h * t) / h for h in range(1, 5))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    silence = np.zeros(rate // 2)
+    signal = np.concatenate([silence, voiced * envelope, silence])
+    samples = (signal * 6000).astype(np.int16)
+    for i in range(0, len(samples), 960):
+        frame = av.AudioFrame.from_ndarray(samples[i:i+960].reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            out.mux(packet)
+    for packet in stream.encode(None):
+        out.mux(packet)
+    out.close()
+    return buffer.getvalue()
+
+
+def dominant_frequency(wav_bytes: bytes) -> float:
+    import wave
+    with wave.open(io.BytesIO(wav_bytes)) as wav:
+        rate = wav.getframerate()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    spectrum = np.abs(np.fft.rfft(pcm.astype(np.float32)))
+    return float(np.fft.rfftfreq(len(pcm), 1 / rate)[spectrum.argmax()])
+
+
+class FingerprintTranscriptions:
+    """Stands in for client.audio.transcriptions in offline mode."""
+
+    async def create(self, model: str, file):
+        _, audio_bytes, _ = file
+        await asyncio.sleep(0.05)  # yield like a network call would
+        return SimpleNamespace(text=f"{dominant_frequency(audio_bytes):.0f}")
+
+
+# -------------------------------------------------------
+# Stress run
+# -------------------------------------------------------
+async def run_turn(i: int, audio: bytes, expected: str, live: bool) -> list[str]:
+    from utils.audio_converter import convert_for_stt
+    from utils.audio_pool import run_audio_job
+    from utils.speech_to_text import transcribe_wav_bytes, transcribe_in_chunks
+
+    errors = []
+
+    def matches(text: str) -> bool:
+        if live:
+            return expected in text
+        return abs(float(text or 0) - float(expected)) < 10
+
+    wav_bytes, _ = await run_audio_job(convert_for_stt, audio)
+    text = await transcribe_wav_bytes(wav_bytes)
+    if not matches(text):
+        errors.append(f"turn {i}: expected {expected!r}, got {text!r}")
+
+    if not live:
+        async for part in transcribe_in_chunks(audio, chunk_ms=1000, mime_type="audio/webm"):
+            if not matches(part):
+                errors.append(f"turn {i} (chunked): expected {expected!r}, got {part!r}")
+
+    return errors
+
+
+async def main(turns: int, live: bool):
+    if live:
+        from utils.text_to_speech import synthesize_speech
+        expected = [str(100 + i * 7) for i in range(turns)]
+        print(f"🎤 Synthesizing {turns} live clips...")
+        inputs = await asyncio.gather(*[
+            synthesize_speech(f"The number is {n}.", "opus") for n in expected
+        ])
+    else:
+        import utils.stt_backends as stt
+        stt.client = SimpleNamespace(audio=SimpleNamespace(transcriptions=FingerprintTranscriptions()))
+        expected = [str(300 + i * 37) for i in range(turns)]
+        inputs = [tone_webm(float(f)) for f in expected]
+
+    print(f"🚀 Running {turns} concurrent turns...")
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_turn(i, audio, exp, live) for i, (audio, exp) in enumerate(zip(inputs, expected))
+    ])
+    elapsed = time.perf_counter() - started
+
+    from utils.audio_pool import audio_pool_stats
+    errors = [e for r in results for e in r]
+    print(f"⏱️  {elapsed:.2f}s total | audio pool: {audio_pool_stats()}")
+    if errors:
+        for e in errors:
+            print("❌", e)
+        sys.exit(1)
+    print(f"✅ All {turns} transcripts matched their inputs.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=16)
+    parser.add_argument("--live", action="store_true", help="use TTS + the real Whisper API")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ.setdefault("OPENAI_API_KEY", "offline-stress-check")
+    asyncio.run(main(args.turns, args.live))
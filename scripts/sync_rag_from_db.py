@@ -1,68 +1,94 @@
 # nika_voice_ai/scripts/sync_rag_from_db.py
 
+import sys
 import json
+import sqlite3
+import argparse
 import numpy as np
 from pathlib import Path
-from nika_voice_ai.utils.openai_client import client
 import faiss
 
 # -------------------------------------------------------
 # Paths
 # -------------------------------------------------------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from rag.embedders import EMBED_DIMENSIONS, get_embedder  # noqa: E402
+from rag.embedding_cache import EmbeddingCache  # noqa: E402
+from rag.index_registry import ChunkRegistry  # noqa: E402
+from rag.chunk_store import write_chunk_store  # noqa: E402
+from rag.vector_store import write_vectors  # noqa: E402
+from rag.manifest import (  # noqa: E402
+    INDEX_FILE,
+    build_path,
+    new_build_dir,
+    prune_builds,
+    read_manifest,
+    write_manifest,
+)
+from scripts.metadata import extract_metadata, normalize_country, classify_visa_type, detect_language  # noqa: E402
+from rag.index_factory import (  # noqa: E402
+    INDEX_TYPE,
+    VECTOR_STORAGE,
+    build_index,
+    configure_search,
+    index_kind,
+    index_storage,
+    needs_rerank,
+    normalize,
+    resolve_index_type,
+    supports_removal,
+)
 
 DB_JSON = PROJECT_ROOT / "data" / "db" / "records.json"
 CHUNK_DIR = PROJECT_ROOT / "data" / "chunks"
+SQLITE_DB = PROJECT_ROOT / "db" / "nika_data.db"
 
-OUTPUT_FAISS = PROJECT_ROOT / "rag" / "nika_index.faiss"
-OUTPUT_TXT = PROJECT_ROOT / "data" / "processed" / "all_knowledge.txt"
+EMBED_CACHE_DB = PROJECT_ROOT / "rag" / "embedding_cache.sqlite"
 
-OUTPUT_FAISS.parent.mkdir(parents=True, exist_ok=True)
-OUTPUT_TXT.parent.mkdir(parents=True, exist_ok=True)
+# NIKA_EMBED_BACKEND=openai|onnx picks the embedder; its model id is recorded
+# in the build manifest and the retriever embeds queries with the same one
+EMBEDDER = get_embedder()
+EMBED_MODEL = EMBEDDER.model
 
 
 # -------------------------------------------------------
 # Embedding Helper
 # -------------------------------------------------------
-async def embed(texts: list[str]):
-    """Generate embeddings from OpenAI safely."""
-    if not texts:
-        return []
-
-    # OpenAI requires strict list[str]
-    cleaned = [str(t).strip() for t in texts if isinstance(t, str) and t.strip()]
-
-    if not cleaned:
-        print("⚠️ No valid text entries to embed.")
-        return []
-
-    response = await client.embeddings.create(
-        model="text-embedding-3-small",
-        input=cleaned
-    )
-
-    return [item.embedding for item in response.data]
+async def embed(texts: list[str]) -> np.ndarray:
+    """
+    Generate embeddings with the configured embedder (OpenAI or local ONNX).
+    Unchanged texts come from the persistent embedding cache; only new
+    or edited ones are embedded (see rag/embeddings.py). Rows follow input order.
+    """
+    cache = EmbeddingCache(EMBED_CACHE_DB)
+    try:
+        return await EMBEDDER.embed_documents(texts, cache=cache)
+    finally:
+        cache.close()
 
 
 # -------------------------------------------------------
 # Load Chunked Text
 # -------------------------------------------------------
-def load_chunks() -> list[str]:
-    texts = []
+def load_chunks() -> dict[str, str]:
+    """{"chunks/<folder>/<file>": text} — the path is the chunk's stable key."""
+    texts = {}
 
     if not CHUNK_DIR.exists():
         print("⚠️ No chunk directory found:", CHUNK_DIR)
-        return []
+        return {}
 
-    for folder in CHUNK_DIR.iterdir():
+    for folder in sorted(CHUNK_DIR.iterdir()):
         if not folder.is_dir():
             continue
 
-        for file in folder.glob("*.txt"):
+        for file in sorted(folder.glob("*.txt")):
             try:
                 content = file.read_text(encoding="utf-8", errors="ignore").strip()
                 if content:
-                    texts.append(content)
+                    texts[f"chunks/{folder.name}/{file.name}"] = content
             except Exception as e:
                 print(f"❌ Error reading chunk {file}: {e}")
 
@@ -72,67 +98,281 @@ def load_chunks() -> list[str]:
 # -------------------------------------------------------
 # Load DB JSON Records
 # -------------------------------------------------------
-def load_database_records() -> list[str]:
+def load_database_records() -> dict[str, str]:
     if not DB_JSON.exists():
-        return []
+        return {}
 
     try:
         data = json.loads(DB_JSON.read_text())
-        return [d.get("text", "").strip() for d in data if isinstance(d, dict)]
+        return {
+            f"records:{d.get('id', i)}": str(d.get("text", "")).strip()
+            for i, d in enumerate(data) if isinstance(d, dict)
+        }
     except Exception as e:
         print("❌ JSON load error:", e)
-        return []
+        return {}
 
 
 # -------------------------------------------------------
-# Save Plaintext Debug Dump
+# Load visa_programs rows (SQLite)
 # -------------------------------------------------------
-def save_plaintext(texts: list[str]):
-    merged = "\n\n".join(texts)
-    OUTPUT_TXT.write_text(merged, encoding="utf-8")
+VISA_FIELDS = ["requirements", "eligibility", "duration", "fee", "benefits", "application_link"]
+
+
+def load_visa_programs() -> dict[str, str]:
+    if not SQLITE_DB.exists():
+        return {}
+
+    try:
+        conn = sqlite3.connect(str(SQLITE_DB))
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM visa_programs").fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print("❌ visa_programs load error:", e)
+        return {}
+
+    records = {}
+    for row in rows:
+        lines = [f"{row['country']} — {row['visa_type']}"]
+        lines += [f"{field.replace('_', ' ').title()}: {row[field]}" for field in VISA_FIELDS if row[field]]
+        records[f"visa_programs:{row['id']}"] = "\n".join(lines)
+    return records
+
+
+def collect_records() -> dict[str, str]:
+    records = {**load_database_records(), **load_visa_programs(), **load_chunks()}
+    return {key: text for key, text in records.items() if isinstance(text, str) and text.strip()}
 
 
 # -------------------------------------------------------
-# Main FAISS Builder
+# Chunk Metadata (source, country, visa_type, language)
 # -------------------------------------------------------
-def run():
-    import asyncio
+def chunk_metadata(key: str, text: str) -> dict:
+    if key.startswith("chunks/"):
+        return extract_metadata(Path(key), text)
+
+    if key.startswith("visa_programs:"):
+        # First line is "<country> — <visa_type>" (see load_visa_programs)
+        country, _, visa_type = text.split("\n", 1)[0].partition(" — ")
+        return {
+            "source": key,
+            "country": normalize_country(country),
+            "visa_type": classify_visa_type(visa_type),
+            "language": detect_language("", text),
+        }
+
+    return {
+        "source": key,
+        "country": "unknown",
+        "visa_type": classify_visa_type(text[:200]),
+        "language": detect_language("", text),
+    }
 
-    print("🧠 Loading text & DB records...")
 
-    db_records = load_database_records()
-    chunks = load_chunks()
+# -------------------------------------------------------
+# Index I/O
+# -------------------------------------------------------
+def load_index():
+    """The current build's index, or None if there is none / it can't be extended."""
+    manifest = read_manifest()
+    if manifest is None:
+        print("ℹ️ No index manifest yet — building from scratch.")
+        return None
+    if manifest["model"] != EMBED_MODEL:
+        print(f"ℹ️ Embedding model changed ({manifest['model']} → {EMBED_MODEL}) — rebuilding.")
+        return None
+    if manifest.get("embed_dimensions") != EMBED_DIMENSIONS:
+        print(f"ℹ️ Embedding dimensions changed ({manifest.get('embed_dimensions')} → {EMBED_DIMENSIONS}) — rebuilding.")
+        return None
+    path = build_path(manifest)
+    if not path.exists():
+        print(f"⚠️ Current build is missing ({path}) — rebuilding.")
+        return None
+    index = faiss.read_index(str(path))
+    if not isinstance(index, faiss.IndexIDMap2):
+        print("ℹ️ Legacy FAISS index without stable IDs — rebuilding.")
+        return None
+    return configure_search(index)
+
+
+def index_ids(index) -> np.ndarray:
+    return faiss.vector_to_array(index.id_map).astype("int64")
+
+
+def expected_storage(index_type: str, n: int) -> str:
+    return "pq" if resolve_index_type(index_type, n) == "ivf_pq" else VECTOR_STORAGE
+
+
+async def registry_vectors(registry: ChunkRegistry) -> tuple[list[int], np.ndarray]:
+    """Full-precision vectors of every registered chunk (served by the embedding cache)."""
+    texts = registry.texts()
+    ids = sorted(texts)
+    return ids, await embed([texts[i] for i in ids])
+
+
+def write_index(index, registry: ChunkRegistry, rerank_vectors: tuple[list[int], np.ndarray] | None = None) -> dict:
+    """
+    Write index + chunk store (+ full-precision rerank vectors for lossy
+    indexes) into a fresh build directory, then publish it by atomically
+    replacing the manifest. Returns the new manifest.
+    """
+    version, build_dir = new_build_dir()
+    index_path = build_dir / INDEX_FILE
+    write_chunk_store(index_path, registry.chunks())
+    faiss.write_index(index, str(index_path))
+    if rerank_vectors is not None:
+        write_vectors(index_path, *rerank_vectors)
+
+    manifest = write_manifest(
+        version,
+        build_dir,
+        model=EMBED_MODEL,
+        dimensions=index.d,
+        count=index.ntotal,
+        index_type=index_kind(index),
+        storage=index_storage(index),
+        embed_dimensions=EMBED_DIMENSIONS,
+    )
+    prune_builds()
+    return manifest
 
-    # Combine & clean
-    all_texts = [t for t in (db_records + chunks) if isinstance(t, str) and t.strip()]
 
-    print(f"📦 Total data entries: {len(all_texts)}")
+# -------------------------------------------------------
+# Incremental Sync
+# -------------------------------------------------------
+def register(registry: ChunkRegistry, records: dict[str, str], keys: list[str]) -> np.ndarray:
+    """Upsert chunks (text + metadata) and return their stable IDs."""
+    return np.array(
+        [registry.upsert(key, records[key], chunk_metadata(key, records[key])) for key in keys],
+        dtype="int64",
+    )
 
-    if not all_texts:
-        print("⚠️ No data found — FAISS index not updated.")
-        return
 
-    async def build():
-        print("🔍 Generating embeddings...")
-        vectors = await embed(all_texts)
+async def full_rebuild(registry: ChunkRegistry, records: dict[str, str]):
+    """
+    Index every record from scratch (cached embeddings keep this cheap).
+    Also trains IVF / PQ indexes on the full corpus.
+    """
+    _, _, removed = registry.diff(records)
+    registry.remove(removed)
+    keys = list(records)
+    ids = register(registry, records, keys)
+
+    vectors = await embed([records[key] for key in keys])
+    print(f"🏗️  Building {INDEX_TYPE} index ({VECTOR_STORAGE}) over {len(keys)} vectors...")
+    return build_index(vectors, ids, INDEX_TYPE)
+
+
+async def sync(records: dict[str, str]):
+    registry = ChunkRegistry()
+    try:
+        index = load_index()
+        if index is not None and set(index_ids(index)) != set(registry.ids()):
+            print("⚠️ FAISS index and chunk registry disagree — rebuilding.")
+            index = None
+        elif index is not None and index_kind(index) != resolve_index_type(INDEX_TYPE, len(records)):
+            print(f"ℹ️ Index type changed ({index_kind(index)} → {INDEX_TYPE}) — rebuilding.")
+            index = None
+        elif index is not None and index_storage(index) != expected_storage(INDEX_TYPE, len(records)):
+            print(f"ℹ️ Vector storage changed ({index_storage(index)} → {VECTOR_STORAGE}) — rebuilding.")
+            index = None
+
+        if index is None:
+            index = await full_rebuild(registry, records)
+        else:
+            added, changed, removed = registry.diff(records)
+            print(f"🔁 {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+            if not (added or changed or removed):
+                print("✅ FAISS index already up to date.")
+                return
+
+            upserts = added + changed
+            vectors = await embed([records[key] for key in upserts]) if upserts else None
+
+            if vectors is not None and vectors.shape[1] != index.d:
+                print("ℹ️ Embedding dimension changed — rebuilding.")
+                index = await full_rebuild(registry, records)
+            elif (changed or removed) and not supports_removal(index):
+                # HNSW graphs can't delete nodes; rebuild from cached embeddings
+                index = await full_rebuild(registry, records)
+            else:
+                known = registry.entries()
+                stale = [known[key][0] for key in changed] + registry.remove(removed)
+                if stale:
+                    index.remove_ids(np.array(stale, dtype="int64"))
+                if upserts:
+                    ids = register(registry, records, upserts)
+                    index.add_with_ids(normalize(vectors), ids)
+
+        rerank_vectors = await registry_vectors(registry) if needs_rerank(index) else None
+        manifest = write_index(index, registry, rerank_vectors)
+        registry.commit()
+        print(f"📦 Published build {manifest['version']} ({index.ntotal} vectors, {manifest['model']})")
+    except BaseException:
+        registry.rollback()
+        raise
+    finally:
+        registry.close()
+
+
+# -------------------------------------------------------
+# Compaction
+# -------------------------------------------------------
+async def compact():
+    """
+    Rebuild the index densely in ID order from the registry, dropping
+    vectors no chunk points at, and vacuum the registry. Vectors come from
+    the embedding cache, so only chunks it is missing reach the API. This
+    also retrains IVF centroids after the corpus has drifted.
+    """
+    registry = ChunkRegistry()
+    try:
+        index = load_index()
+        if index is None:
+            print("⚠️ No ID-mapped index to compact — run a sync first.")
+            return
 
-        if not vectors:
-            print("❌ No embeddings returned — aborting.")
+        texts = registry.texts()
+        ids = sorted(texts)
+        if not ids:
+            print("⚠️ Chunk registry is empty — nothing to compact.")
             return
 
-        dim = len(vectors[0])
-        index = faiss.IndexFlatL2(dim)
+        vectors = await embed([texts[i] for i in ids])
+        compacted = build_index(vectors, ids, INDEX_TYPE)
+        print(f"🧹 Compacted: {index.ntotal} → {compacted.ntotal} vectors ({index_kind(compacted)})")
 
-        index.add(np.array(vectors).astype("float32"))
+        manifest = write_index(compacted, registry, (ids, vectors) if needs_rerank(compacted) else None)
+        registry.vacuum()
+        print(f"📦 Published build {manifest['version']}")
+    finally:
+        registry.close()
 
-        faiss.write_index(index, str(OUTPUT_FAISS))
-        save_plaintext(all_texts)
 
-        print("📦 FAISS index saved:", OUTPUT_FAISS)
-        print("🗂️  Text dump saved:", OUTPUT_TXT)
+# -------------------------------------------------------
+# Entry Point
+# -------------------------------------------------------
+def run(compact_only: bool = False):
+    import asyncio
+
+    if compact_only:
+        asyncio.run(compact())
+        return
+
+    print("🧠 Loading text & DB records...")
+    records = collect_records()
+    print(f"📦 Total data entries: {len(records)}")
+
+    if not records:
+        print("⚠️ No data found — FAISS index not updated.")
+        return
 
-    asyncio.run(build())
+    asyncio.run(sync(records))
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Sync the FAISS index with chunks and DB records.")
+    parser.add_argument("--compact", action="store_true", help="rewrite the index densely instead of syncing")
+    args = parser.parse_args()
+    run(compact_only=args.compact)
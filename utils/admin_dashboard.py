@@ -1,10 +1,13 @@
 import os
-from fastapi import APIRouter, Request
+import hmac
+from fastapi import APIRouter, Header, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from utils.answer_cache import answer_cache
+
 load_dotenv()
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -14,6 +17,16 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# 🔑 Required (X-Admin-Token header) by the cache admin endpoints; unset → they stay closed
+ADMIN_TOKEN = os.getenv("NIKA_ADMIN_TOKEN")
+
+
+def _check_admin_token(token: str | None):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token not configured")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 
 @router.get("/admin", response_class=HTMLResponse)
 async def admin_dashboard(request: Request):
@@ -48,3 +61,26 @@ async def admin_dashboard(request: Request):
             "converted": converted,
         },
     )
+
+
+# ----------------------------------------------------
+# ⚡ Semantic answer cache
+# ----------------------------------------------------
+@router.get("/admin/answer-cache")
+async def answer_cache_entries(limit: int = 50, x_admin_token: str | None = Header(None)):
+    """Cache stats and the most-hit entries."""
+    _check_admin_token(x_admin_token)
+    return {"stats": answer_cache.snapshot(), "entries": answer_cache.entries(limit)}
+
+
+@router.delete("/admin/answer-cache")
+async def purge_answer_cache(
+    language: str | None = None,
+    intent: str | None = None,
+    index_version: str | None = None,
+    x_admin_token: str | None = Header(None),
+):
+    """Drop cached answers matching the given filters (none → all of them)."""
+    _check_admin_token(x_admin_token)
+    purged = answer_cache.purge(language, intent, index_version)
+    return {"purged": purged, "stats": answer_cache.snapshot()}
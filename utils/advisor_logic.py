@@ -17,13 +17,15 @@ def log(tag: str, message: str, level: str = "info"):
 # ---------------------------------------------------
 # 🎯 Detect mode: advisory vs general Q&A
 # ---------------------------------------------------
-async def detect_mode(user_text: str, user_id: str):
+async def detect_mode(user_text: str, user_id: str, session: dict | None = None):
     """
     Detect if user wants general questions (qa) or personalized advice (advisory).
     Remembers user’s mode inside the session.
+    Pass `session` when the caller already fetched it this turn.
     """
     text = user_text.lower()
-    session = await get_session(user_id)
+    if session is None:
+        session = await get_session(user_id)
     mode = "qa"
 
     # Check existing mode
@@ -44,12 +46,14 @@ async def detect_mode(user_text: str, user_id: str):
 # ---------------------------------------------------
 # 🧠 Get or ask for user’s immigration profile
 # ---------------------------------------------------
-async def get_or_ask_profile(user_id: str):
+async def get_or_ask_profile(user_id: str, session: dict | None = None):
     """
     Retrieve user's immigration profile or ask missing questions.
     Example fields: age, degree, English level, marital status, budget.
+    Pass `session` when the caller already fetched it this turn.
     """
-    session = await get_session(user_id)
+    if session is None:
+        session = await get_session(user_id)
     profile = {}
 
     # ✅ Safely extract profile
@@ -0,0 +1,196 @@
+# utils/answer_cache.py
+"""
+Semantic cache for finished answers.
+
+Most traffic is a handful of recurring questions ("startup visa
+requirements", "blocked account amount", ...) asked in slightly different
+words. Each answered general question is stored with its query embedding
+— the vector RAG retrieval already computed for it — and a later question whose
+embedding is at least NIKA_ANSWER_CACHE_THRESHOLD cosine-similar gets the
+stored answer back without retrieval or GPT. Speech for it comes from the
+TTS cache (utils/tts_cache.py), which is keyed by the answer text, so a
+hit skips synthesis too.
+
+Entries are scoped by (language, intent, index version): a Persian
+question never gets an English answer, and answers built from an older
+index are dropped as soon as a new build goes live. Bounded by TTL and LRU
+size; every entry counts its hits.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("NIKA_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("NIKA_ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("NIKA_ANSWER_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("NIKA_ANSWER_CACHE_THRESHOLD", "0.92"))
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, dict] = OrderedDict()  # LRU order, oldest first
+        self._scopes: dict[tuple, dict[int, np.ndarray]] = {}   # scope → {entry id: unit vector}
+        self._next_id = 0
+        self._version = None
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "purged": 0}
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype="float32").ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, entry_id: int) -> dict | None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            scope = self._scopes.get(entry["scope"])
+            if scope is not None:
+                scope.pop(entry_id, None)
+                if not scope:
+                    del self._scopes[entry["scope"]]
+        return entry
+
+    def _follow_version(self, version):
+        """Answers are only valid for the index they were built from."""
+        if version == self._version:
+            return
+        self._version = version
+        for entry_id in [i for i, e in self._entries.items() if e["scope"][2] != version]:
+            self._drop(entry_id)
+            self.stats["purged"] += 1
+
+    def _best(self, scope: tuple, vector: np.ndarray, now: float):
+        """(entry id, similarity) of the closest live entry in `scope`, or (None, 0)."""
+        while True:
+            candidates = self._scopes.get(scope)
+            if not candidates:
+                return None, 0.0
+            ids = list(candidates)
+            scores = np.vstack([candidates[i] for i in ids]) @ vector
+            best = int(np.argmax(scores))
+            entry_id = ids[best]
+            if now - self._entries[entry_id]["created"] <= self.ttl:
+                return entry_id, float(scores[best])
+            self._drop(entry_id)
+            self.stats["expirations"] += 1
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def lookup(self, vector, language: str, intent: str, version) -> dict | None:
+        """The cached entry for a question this similar, or None."""
+        vector = self._unit(vector)
+        scope = (language, intent, version)
+        now = time.time()
+        with self._lock:
+            self._follow_version(version)
+            entry_id, similarity = self._best(scope, vector, now)
+            if entry_id is None or similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            entry = self._entries[entry_id]
+            entry["hits"] += 1
+            entry["last_hit"] = now
+            self._entries.move_to_end(entry_id)
+            self.stats["hits"] += 1
+            return {**entry, "similarity": round(similarity, 4)}
+
+    def store(self, vector, language: str, intent: str, version, query: str, answer: str):
+        """Remember `answer`; a near-duplicate entry in the same scope is replaced."""
+        if not answer:
+            return
+        vector = self._unit(vector)
+        scope = (language, intent, version)
+        now = time.time()
+        with self._lock:
+            self._follow_version(version)
+            entry_id, similarity = self._best(scope, vector, now)
+            if entry_id is not None and similarity >= self.threshold:
+                self._drop(entry_id)
+
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[entry_id] = {
+                "id": entry_id,
+                "scope": scope,
+                "query": query,
+                "answer": answer,
+                "created": now,
+                "last_hit": None,
+                "hits": 0,
+            }
+            self._scopes.setdefault(scope, {})[entry_id] = vector
+            self.stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def purge(self, language: str | None = None, intent: str | None = None, version=None) -> int:
+        """Drop entries matching every given field (nothing given → everything)."""
+        with self._lock:
+            doomed = [
+                entry_id for entry_id, entry in self._entries.items()
+                if (language is None or entry["scope"][0] == language)
+                and (intent is None or entry["scope"][1] == intent)
+                and (version is None or entry["scope"][2] == version)
+            ]
+            for entry_id in doomed:
+                self._drop(entry_id)
+            self.stats["purged"] += len(doomed)
+            return len(doomed)
+
+    def entries(self, limit: int = 50) -> list[dict]:
+        """Most-hit entries first (for the admin view)."""
+        with self._lock:
+            items = sorted(self._entries.values(), key=lambda e: (-e["hits"], -e["created"]))[:limit]
+            return [
+                {
+                    "id": e["id"],
+                    "language": e["scope"][0],
+                    "intent": e["scope"][1],
+                    "index_version": e["scope"][2],
+                    "query": e["query"],
+                    "answer": e["answer"],
+                    "hits": e["hits"],
+                    "age_s": round(time.time() - e["created"], 1),
+                }
+                for e in items
+            ]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "index_version": self._version,
+            }
+
+
+answer_cache = AnswerCache()
+
+
+def query_vector(text: str, intent: str = "unknown"):
+    """
+    (query embedding, index version) that RAG retrieval computed for this
+    question — no embedding call of its own — or (None, None) when there
+    is none (no build loaded, or retrieval took the lexical fast path).
+    """
+    from rag.retriever import cached_query_embedding
+
+    return cached_query_embedding(text, intent)
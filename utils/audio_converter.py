@@ -1,105 +1,139 @@
-import os
-import subprocess
-import tempfile
-import uuid
+import io
+import wave
 
+import av
+import numpy as np
 
-def convert_to_wav(input_bytes: bytes, mime_type: str = "audio/webm") -> str:
+from utils.vad import trim_silence, VAD_SAMPLE_RATE
+
+# Whisper only needs speech bandwidth; 12 kHz mono keeps uploads small
+STT_SAMPLE_RATE = 12000
+
+# Container hints for browser uploads (probing still works without one)
+FORMAT_HINTS = {
+    "audio/webm": "matroska",
+    "video/webm": "matroska",
+    "audio/ogg": "ogg",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+}
+
+
+def decode_to_pcm(
+    input_bytes: bytes,
+    mime_type: str = "audio/webm",
+    sample_rate: int = STT_SAMPLE_RATE,
+) -> np.ndarray:
     """
-    Convert browser audio (WebM/Opus fragments) to 16 kHz mono WAV.
-    
-    MediaRecorder sends WebM fragments that need special handling.
-    Uses FFmpeg with format hints and error tolerance for streaming WebM.
+    Decode browser audio (WebM/Opus fragments, Ogg, WAV, ...) in-process
+    and resample it to mono 16-bit PCM at `sample_rate`.
+
+    MediaRecorder fragments are often truncated or carry corrupt packets;
+    like the old `-err_detect ignore_err` FFmpeg call, bad packets are
+    skipped and whatever decoded cleanly is kept.
     """
     if not input_bytes or len(input_bytes) < 4000:
         raise Exception("insufficient data")
 
-    tmp_dir = tempfile.gettempdir()
-    in_path = os.path.join(tmp_dir, f"nika_in_{uuid.uuid4().hex}.webm")
-    out_path = os.path.join(tmp_dir, f"nika_out_{uuid.uuid4().hex}.wav")
+    fmt = FORMAT_HINTS.get((mime_type or "").split(";")[0].strip())
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+    chunks = []
 
     try:
-        # Write input bytes to file
-        with open(in_path, "wb") as f:
-            f.write(input_bytes)
-            f.flush()
-
-        # FFmpeg command with WebM format handling
-        # Key flags for handling WebM fragments:
-        # -f webm: Force WebM format (helps with fragments)
-        # -fflags +genpts: Generate PTS for streams without timestamps
-        # -err_detect ignore_err: Ignore errors in stream
-        # -analyzeduration and -probesize: Quick analysis for streaming
-        cmd = [
-            "ffmpeg",
-            "-hide_banner",
-            "-loglevel", "error",
-            "-nostdin",
-            "-y",
-            "-f", "webm",           # Force WebM format
-            "-fflags", "+genpts+discardcorrupt",  # Generate PTS, discard corrupt
-            "-err_detect", "ignore_err",
-            "-analyzeduration", "1000000",  # 1 second analysis
-            "-probesize", "1000000",        # 1 MB probe size
-            "-i", in_path,
-            "-ac", "1",              # mono
-            "-ar", "16000",          # 16kHz
-            "-vn",                   # No video
-            "-f", "wav",             # Output WAV format
-            out_path,
-        ]
-
-        success = False
-        stderr_output = None
-        for attempt in range(2):
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=20,
-            )
-            
-            stderr_output = result.stderr.decode('utf-8', errors='ignore') if result.stderr else ""
-
-            if result.returncode == 0 and os.path.exists(out_path):
-                size = os.path.getsize(out_path)
-                if size > 2000:
-                    success = True
-                    break
-            elif attempt == 0:
-                # On first failure, check if it's a format issue
-                # Sometimes FFmpeg needs the data to be treated as a stream
-                # Try with pipe input approach on second attempt
-                pass
-
-        if not success:
-            # Check stderr for specific errors
-            if stderr_output:
-                if "Invalid data found" in stderr_output or "moov atom not found" in stderr_output:
-                    raise Exception("invalid fragment - incomplete WebM data")
-                elif "End of file" in stderr_output:
-                    raise Exception("invalid fragment - incomplete WebM data")
+        container = av.open(
+            io.BytesIO(input_bytes),
+            format=fmt,
+            options={"fflags": "+genpts+discardcorrupt"},
+        )
+    except av.error.FFmpegError:
+        if fmt is None:
+            raise Exception("invalid fragment")
+        # Wrong hint (e.g. Safari sends MP4 as audio/webm) → let FFmpeg probe
+        try:
+            container = av.open(io.BytesIO(input_bytes))
+        except av.error.FFmpegError:
             raise Exception("invalid fragment")
 
-        return out_path
-
-    except subprocess.TimeoutExpired:
-        print("⚠️ FFmpeg timeout while converting fragment")
-        raise Exception("ffmpeg timeout")
-    except Exception as e:
-        # Re-raise our custom exceptions
-        if "invalid fragment" in str(e) or "insufficient data" in str(e):
-            raise
-        # Log unexpected errors
-        error_msg = str(e).lower()
-        expected_errors = ["ffmpeg skipped", "timeout"]
-        if not any(err in error_msg for err in expected_errors):
-            print(f"⚠️ FFmpeg conversion error: {e}")
-        raise
-    finally:
-        # Clean input file only; keep output for next stage
-        if os.path.exists(in_path):
-            try:
-                os.remove(in_path)
-            except Exception:
-                pass
+    with container:
+        stream = next((s for s in container.streams if s.type == "audio"), None)
+        if stream is None:
+            raise Exception("invalid fragment - no audio stream")
+
+        try:
+            for packet in container.demux(stream):
+                try:
+                    frames = packet.decode()
+                except av.error.InvalidDataError:
+                    continue
+                for frame in frames:
+                    for out in resampler.resample(frame):
+                        chunks.append(out.to_ndarray().reshape(-1))
+        except av.error.FFmpegError:
+            # Truncated tail of a fragment — keep what decoded so far
+            if not chunks:
+                raise Exception("invalid fragment - incomplete WebM data")
+
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray().reshape(-1))
+
+    if not chunks:
+        raise Exception("invalid fragment")
+    return np.concatenate(chunks).astype(np.int16, copy=False)
+
+
+def encode_wav(pcm: np.ndarray, sample_rate: int = STT_SAMPLE_RATE) -> bytes:
+    """Wrap mono 16-bit PCM samples in an in-memory WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def resample_pcm(pcm: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Resample mono 16-bit PCM in memory."""
+    if src_rate == dst_rate or not len(pcm):
+        return pcm
+    frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+    frame.sample_rate = src_rate
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=dst_rate)
+    chunks = [out.to_ndarray().reshape(-1) for out in resampler.resample(frame)]
+    chunks += [out.to_ndarray().reshape(-1) for out in resampler.resample(None)]
+    return np.concatenate(chunks) if chunks else pcm[:0]
+
+
+def pcm_to_stt_wav(pcm: np.ndarray, sample_rate: int = STT_SAMPLE_RATE):
+    """
+    16 kHz PCM (see `decode_to_pcm`) → VAD-trimmed WAV at `sample_rate`.
+    Returns (wav_bytes, speech_ms); `wav_bytes` is empty when the clip
+    holds no speech.
+    """
+    speech, speech_ms = trim_silence(pcm, VAD_SAMPLE_RATE)
+    if not len(speech):
+        print(f"🤫 No speech detected ({speech_ms} ms) — skipping STT.")
+        return b"", speech_ms
+
+    print(f"✂️ VAD kept {len(speech) / VAD_SAMPLE_RATE:.2f}s of {len(pcm) / VAD_SAMPLE_RATE:.2f}s "
+          f"(speech {speech_ms} ms)")
+    wav_bytes = encode_wav(resample_pcm(speech, VAD_SAMPLE_RATE, sample_rate), sample_rate)
+    return wav_bytes, speech_ms
+
+
+def convert_for_stt(
+    input_bytes: bytes,
+    mime_type: str = "audio/webm",
+    sample_rate: int = STT_SAMPLE_RATE,
+):
+    """
+    Uploaded audio bytes → the exact mono WAV handed to the STT engine
+    (12 kHz for the Whisper API, 16 kHz for local faster-whisper).
+    In-memory decode, VAD silence trimming, then downsampling: no FFmpeg
+    process, no temp files.
+
+    Returns (wav_bytes, speech_ms). `wav_bytes` is empty when the clip
+    holds no speech, so callers can skip the STT call entirely.
+    """
+    pcm = decode_to_pcm(input_bytes, mime_type=mime_type, sample_rate=VAD_SAMPLE_RATE)
+    return pcm_to_stt_wav(pcm, sample_rate)
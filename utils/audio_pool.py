@@ -0,0 +1,103 @@
+# utils/audio_pool.py
+"""
+Bounded worker pool for CPU-bound audio work (decode / resample / VAD).
+
+Async handlers must never run audio conversion inline: it would freeze the
+uvicorn event loop for every other user. Jobs go to a small dedicated
+thread pool instead (PyAV releases the GIL while decoding), with a cap on
+how many may wait, a per-job timeout, and queue-depth / wait-time metrics.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+AUDIO_WORKERS = int(os.getenv("NIKA_AUDIO_WORKERS", "2"))
+AUDIO_QUEUE_LIMIT = int(os.getenv("NIKA_AUDIO_QUEUE_LIMIT", "32"))
+AUDIO_TIMEOUT = float(os.getenv("NIKA_AUDIO_TIMEOUT", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="nika-audio")
+_lock = threading.Lock()
+_wait_ms = deque(maxlen=500)
+_run_ms = deque(maxlen=500)
+_stats = {
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "timeouts": 0,
+}
+
+
+class AudioPoolBusy(Exception):
+    """Raised when too many audio jobs are already waiting."""
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 2)
+
+
+async def run_audio_job(fn, *args, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` on the audio pool and await its result.
+    Raises AudioPoolBusy when the queue is full and TimeoutError when the
+    job takes longer than AUDIO_TIMEOUT (wait + run).
+    """
+    with _lock:
+        if _stats["queued"] >= AUDIO_QUEUE_LIMIT:
+            _stats["rejected"] += 1
+            raise AudioPoolBusy("audio queue full")
+        _stats["queued"] += 1
+
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        with _lock:
+            _stats["queued"] -= 1
+            _stats["running"] += 1
+            _wait_ms.append((started - submitted) * 1000)
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with _lock:
+                _stats["running"] -= 1
+                _stats["completed" if ok else "failed"] += 1
+                _run_ms.append((time.perf_counter() - started) * 1000)
+
+    future = _executor.submit(job)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), AUDIO_TIMEOUT)
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats["timeouts"] += 1
+        # Drop the job if it never started; a running decode finishes on its own
+        if future.cancel():
+            with _lock:
+                _stats["queued"] -= 1
+        print("⚠️ Audio job timed out")
+        raise
+
+
+def audio_pool_stats() -> dict:
+    """Snapshot of queue depth, throughput and wait/run latencies (ms)."""
+    with _lock:
+        return {
+            **_stats,
+            "workers": AUDIO_WORKERS,
+            "queue_limit": AUDIO_QUEUE_LIMIT,
+            "wait_ms_p50": _percentile(_wait_ms, 0.50),
+            "wait_ms_p95": _percentile(_wait_ms, 0.95),
+            "run_ms_p50": _percentile(_run_ms, 0.50),
+            "run_ms_p95": _percentile(_run_ms, 0.95),
+        }
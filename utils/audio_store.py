@@ -0,0 +1,148 @@
+# utils/audio_store.py
+"""
+Managed storage for synthesized reply clips.
+
+Every voice turn produces a clip that the browser fetches once or twice
+and never again. Clips live in one directory with:
+  • a TTL (expired clips are deleted by a background sweeper)
+  • a total byte cap (least recently served clips are evicted first)
+
+State is kept in the filesystem itself — mtime = created, atime = last
+served — so several worker processes can share one store.
+"""
+
+import os
+import re
+import time
+import uuid
+import asyncio
+import threading
+from pathlib import Path
+
+AUDIO_STORE_DIR = Path(os.getenv("NIKA_AUDIO_STORE_DIR", "data/reply_audio"))
+AUDIO_TTL_SECONDS = int(os.getenv("NIKA_AUDIO_TTL_SECONDS", "3600"))
+AUDIO_STORE_MAX_BYTES = int(os.getenv("NIKA_AUDIO_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+AUDIO_SWEEP_SECONDS = int(os.getenv("NIKA_AUDIO_SWEEP_SECONDS", "60"))
+
+CLIP_ID = re.compile(r"^[0-9a-f]{32}\.(mp3|opus|aac|flac|wav)$")
+
+
+class AudioStore:
+    def __init__(
+        self,
+        directory: Path = AUDIO_STORE_DIR,
+        ttl: int = AUDIO_TTL_SECONDS,
+        max_bytes: int = AUDIO_STORE_MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.stats = {"saved": 0, "served": 0, "expired": 0, "evicted": 0, "sweeps": 0}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+
+    def save(self, data: bytes, fmt: str = "mp3") -> str:
+        """Write a clip atomically and return its id (`<hex>.<fmt>`)."""
+        clip_id = f"{uuid.uuid4().hex}.{fmt}"
+        path = self.directory / clip_id
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.stats["saved"] += 1
+            self._bytes += len(data)
+            over_cap = self._bytes > self.max_bytes
+        if over_cap:
+            self.sweep()
+        return clip_id
+
+    def open(self, clip_id: str):
+        """
+        Return (path, stat) for a live clip, or None if unknown/expired.
+        Marks the clip as recently served for LRU eviction.
+        """
+        if not CLIP_ID.match(clip_id):
+            return None
+        path = self.directory / clip_id
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        if time.time() - st.st_mtime > self.ttl:
+            return None
+
+        try:
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+        with self._lock:
+            self.stats["served"] += 1
+        return path, st
+
+    def sweep(self):
+        """Delete expired clips, then evict least recently served ones over the cap."""
+        now = time.time()
+        live, total = [], 0
+        expired = evicted = 0
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stale_tmp = entry.name.endswith(".tmp") and now - st.st_mtime > 60
+                if stale_tmp or now - st.st_mtime > self.ttl:
+                    self._remove(entry.path)
+                    expired += 1
+                    continue
+                if not entry.name.endswith(".tmp"):
+                    live.append((st.st_atime, entry.path, st.st_size))
+                    total += st.st_size
+
+        if total > self.max_bytes:
+            for _, path, size in sorted(live):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                evicted += 1
+
+        with self._lock:
+            self._bytes = total
+            self.stats["expired"] += expired
+            self.stats["evicted"] += evicted
+            self.stats["sweeps"] += 1
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def run_sweeper(self, interval: int = AUDIO_SWEEP_SECONDS):
+        """Background task: sweep periodically without blocking the event loop."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"⚠️ Audio store sweep failed: {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+            }
+
+
+audio_store = AudioStore()
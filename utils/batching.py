@@ -0,0 +1,63 @@
+# utils/batching.py
+"""
+Cross-request micro-batching for in-process models.
+
+Used by the local ONNX query embedder (rag/embedders.py) and the local
+faster-whisper STT engine (utils/stt_backends.py): single requests from
+many threads or coroutines are collected for a few milliseconds and run
+through the model together.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects single items from many threads and runs them through
+    `fn(items) -> rows` together. The first item waits at most `wait_ms`
+    for company, so a lone request pays a couple of milliseconds and a
+    burst of concurrent ones pays one forward pass instead of N.
+    """
+
+    def __init__(self, fn, max_batch: int, wait_ms: float, name: str = "nika-batch"):
+        self._fn = fn
+        self._max_batch = max(1, max_batch)
+        self._wait = max(0.0, wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                rows = self._fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), row in zip(batch, rows):
+                future.set_result(row)
@@ -1,9 +1,15 @@
 import os
+import time
+import asyncio
+import threading
+from collections import defaultdict, deque
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 from rag.retriever import get_context_for_query  # ✅ RAG
+from utils.intent_classifier import classify_intent
 from utils.session_memory import summarize_memory, save_session, get_session  # 🧠 Memory integration
 from utils.advisor_logic import detect_mode, get_or_ask_profile  # 🎯 Advisory logic
+from utils.answer_cache import ANSWER_CACHE_ENABLED, answer_cache, query_vector  # ⚡ Semantic answer cache
 
 # -------------------------------------------
 # 🧩 Simple internal logger (no dependencies)
@@ -73,24 +79,107 @@ Respond in the same language as the user.
         )
 
 # ----------------------------------------------------
-# 🧠 GPT reply with Mode Switch + RAG + Memory + Smart Tone
+# ⏱️ Per-stage turn timings (shown in /metrics)
 # ----------------------------------------------------
-async def gpt_reply(user_text: str, user_id: str = "web_user", intent: str = "unknown") -> str:
+_stage_lock = threading.Lock()
+_stage_ms: dict[str, deque] = defaultdict(lambda: deque(maxlen=500))
+_background: set[asyncio.Task] = set()  # stages left running after an early reply
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 2)
+
+
+def _record_stages(timings: dict):
+    with _stage_lock:
+        for stage, ms in timings.items():
+            _stage_ms[stage].append(ms)
+    log("⏱️ Turn", " · ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items()))
+
+
+def turn_stage_stats() -> dict:
+    """p50 / p95 (ms) of every pre-LLM stage over recent turns."""
+    with _stage_lock:
+        return {
+            stage: {"count": len(ms), "p50_ms": _percentile(ms, 0.50), "p95_ms": _percentile(ms, 0.95)}
+            for stage, ms in _stage_ms.items()
+        }
+
+
+async def _timed(timings: dict, stage: str, awaitable):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+# ----------------------------------------------------
+# 🧱 Turn stages (each one fails soft)
+# ----------------------------------------------------
+async def _memory_stage(user_id: str) -> str:
+    try:
+        return await summarize_memory(user_id)
+    except Exception:
+        return ""
+
+
+async def _rag_stage(user_text: str, intent: str) -> str:
+    # Blocking (FAISS / BM25 / embedding call) → worker thread, not the event loop
+    try:
+        return await asyncio.to_thread(get_context_for_query, user_text, intent=intent)
+    except Exception:
+        return ""
+
+
+def _answer_cache_key(user_text: str, is_farsi: bool, intent: str):
     """
-    Handles two flows:
-    1️⃣ General Q&A mode (RAG + memory)
-    2️⃣ Advisory mode (profile guidance and personalized suggestions)
-    Adds human-like tone and summarization for multi-question inputs.
+    Semantic cache key (vector, language, intent, index version) for this
+    question, or None. Reuses the query vector RAG retrieval computed, so
+    call it once retrieval is done; a lexical fast-path turn has no vector
+    and skips the cache.
     """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    vector, version = query_vector(user_text, intent)
+    return (vector, "fa" if is_farsi else "en", intent, version) if vector is not None else None
 
-    if not user_text or not user_text.strip():
-        return "⚠️ من صدای واضحی نشنیدم. لطفاً دوباره بگو."
 
+async def _retrieval_stage(user_text: str, is_farsi: bool, intent: str, timings: dict):
+    """(RAG context, answer-cache key): the query is embedded once, for both."""
+    context = await _timed(timings, "rag", _rag_stage(user_text, intent))
+    return context, _answer_cache_key(user_text, is_farsi, intent)
+
+
+# ----------------------------------------------------
+# 🧩 Turn preparation (shared by blocking + streaming replies)
+# ----------------------------------------------------
+async def _prepare_turn(user_text: str, user_id: str):
+    """
+    Run every pre-LLM step of a turn.
+    Returns (early_reply, None) when the turn is answered without GPT
+    (greeting, profile question, cached answer), otherwise (None, plan)
+    where `plan` holds the chat messages and reply shaping for the
+    completion call.
+
+    Stages form a small dependency graph: the session is read once; mode
+    detection, memory summary and RAG retrieval then run concurrently
+    (blocking work in threads), so pre-LLM latency is the slowest stage
+    rather than the sum. The query is embedded once, by retrieval; the
+    answer-cache key is taken from that vector as soon as retrieval ends,
+    and the lookup runs once the mode says the turn is general. The
+    profile step waits for the mode. Stage timings go to /metrics.
+    """
     # 🈯 Detect Farsi vs English
     is_farsi = any("\u0600" <= ch <= "\u06FF" for ch in user_text)
+    timings = {}
+    turn_start = time.perf_counter()
 
-    # 🧊 Detect first-time user
-    session = await get_session(user_id)
+    # 🧊 Detect first-time user (the turn's only session read)
+    session = await _timed(timings, "session", get_session(user_id))
     if not session:
         log("👋 Welcome", "First interaction detected — sending greeting.")
         await save_session(user_id, "intro", "first_greeting", "done")
@@ -102,31 +191,50 @@ async def gpt_reply(user_text: str, user_id: str = "web_user", intent: str = "un
             else
             "سلام! خوش اومدی به نیکا ویزا. "
             "می‌خوای سوالات عمومی مهاجرتی بپرسی یا بر اساس شرایط خودت برات مشاوره شخصی‌سازی‌شده بدم؟"
-        )
+        ), None
 
-    # 🎯 Detect user mode (advisory vs general)
-    mode = await detect_mode(user_text, user_id)
+    # 🔀 Fan out the independent stages
+    intent = classify_intent(user_text)
+    rag_task = asyncio.create_task(_retrieval_stage(user_text, is_farsi, intent, timings))
+    mode, memory_context = await asyncio.gather(
+        _timed(timings, "mode", detect_mode(user_text, user_id, session)),     # 🎯 advisory vs general
+        _timed(timings, "memory", _memory_stage(user_id)),                     # 🧠 past memory summary
+    )
     log("🧭 Mode", f"Active mode: {mode}")
 
-    # 👤 If advisory mode → collect or complete profile
+    early_reply, cache_key = None, None
     if mode == "advisory":
-        profile, question = await get_or_ask_profile(user_id)
+        # 👤 Collect or complete the profile (advisory answers are personal — never cached)
+        profile, question = await _timed(timings, "profile", get_or_ask_profile(user_id, session))
         if question:
-            return question  # Ask next missing field before GPT
+            early_reply = question  # Ask next missing field before GPT
         else:
             log("🧾 Profile", f"Profile complete: {profile}")
+    else:
+        # ⚡ Semantic answer cache, keyed by the vector retrieval computed
+        context, cache_key = await rag_task
+        hit = None
+        if cache_key is not None:
+            start = time.perf_counter()
+            hit = answer_cache.lookup(*cache_key)
+            timings["answer_cache"] = round((time.perf_counter() - start) * 1000, 1)
+        if hit is not None:
+            log("⚡ Answer cache", f"Hit ({hit['similarity']}, {hit['hits']} hits): {hit['query']}", level="success")
+            await save_session(user_id, intent, user_text, hit["answer"])
+            early_reply = hit["answer"]
 
-    # 🧠 Retrieve past memory summary
-    try:
-        memory_context = await summarize_memory(user_id)
-    except Exception:
-        memory_context = ""
+    if early_reply is not None:
+        # Retrieval isn't needed; let it finish in the background (it warms the RAG cache)
+        _background.add(rag_task)
+        rag_task.add_done_callback(_background.discard)
+        timings["total"] = round((time.perf_counter() - turn_start) * 1000, 1)
+        _record_stages(timings)
+        return early_reply, None
 
-    # 🔍 Retrieve RAG context
-    try:
-        context = get_context_for_query(user_text)
-    except Exception:
-        context = ""
+    # 🔍 RAG context (already awaited in general mode)
+    context, _ = await rag_task
+    timings["total"] = round((time.perf_counter() - turn_start) * 1000, 1)
+    _record_stages(timings)
 
     # 💬 Smart handling for multi-question messages
     question_count = user_text.count("?") + user_text.count("؟")
@@ -169,36 +277,125 @@ async def gpt_reply(user_text: str, user_id: str = "web_user", intent: str = "un
         f"{pre_prompt}\nUse this info if relevant:\n{context}\n{memory_context}"
     )
 
-    # 🧠 Dynamic length control
-    max_len = 180 if too_many_questions else 100
+    return None, {
+        "is_farsi": is_farsi,
+        "polite_intro": polite_intro,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text.strip()},
+        ],
+        # 🧠 Dynamic length control
+        "max_tokens": 180 if too_many_questions else 100,
+        # Shared across users, so only answers generated without anyone's memory are stored
+        "answer_cache": cache_key if not memory_context else None,
+    }
+
+
+def _remember_answer(plan: dict, user_text: str, reply: str):
+    """Store a completed general answer in the semantic cache."""
+    if plan.get("answer_cache") is not None and reply:
+        answer_cache.store(*plan["answer_cache"], query=user_text.strip(), answer=reply)
+
+
+def _error_reply(is_farsi: bool) -> str:
+    return (
+        "متاسفم، خطایی رخ داد. لطفاً دوباره تلاش کن."
+        if is_farsi else
+        "Sorry, something went wrong. Please try again."
+    )
+
+
+# ----------------------------------------------------
+# 🧠 GPT reply with Mode Switch + RAG + Memory + Smart Tone
+# ----------------------------------------------------
+async def gpt_reply(user_text: str, user_id: str = "web_user", intent: str = "unknown") -> str:
+    """
+    Handles two flows:
+    1️⃣ General Q&A mode (RAG + memory)
+    2️⃣ Advisory mode (profile guidance and personalized suggestions)
+    Adds human-like tone and summarization for multi-question inputs.
+    """
+
+    if not user_text or not user_text.strip():
+        return "⚠️ من صدای واضحی نشنیدم. لطفاً دوباره بگو."
+
+    early_reply, plan = await _prepare_turn(user_text, user_id)
+    if early_reply is not None:
+        return early_reply
 
     # 🚀 Generate GPT reply
     try:
         completion = await client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_text.strip()},
-            ],
+            messages=plan["messages"],
             temperature=0.45,
-            max_tokens=max_len,
+            max_tokens=plan["max_tokens"],
         )
         reply = completion.choices[0].message.content.strip()
 
-        if too_many_questions:
-            reply = f"{polite_intro}\n{reply}"
+        if plan["polite_intro"]:
+            reply = f"{plan['polite_intro']}\n{reply}"
 
         log("🤖 GPT Reply", reply)
         await save_session(user_id, intent, user_text, reply)
+        _remember_answer(plan, user_text, reply)
         return reply
 
     except Exception as e:
         log("❌ GPT", f"Error: {e}", level="error")
-        return (
-            "متاسفم، خطایی رخ داد. لطفاً دوباره تلاش کن."
-            if is_farsi else
-            "Sorry, something went wrong. Please try again."
+        return _error_reply(plan["is_farsi"])
+
+
+# ----------------------------------------------------
+# 🌊 Streaming GPT reply (token deltas)
+# ----------------------------------------------------
+async def gpt_reply_stream(user_text: str, user_id: str = "web_user", intent: str = "unknown"):
+    """
+    Same flow as `gpt_reply`, but yields the reply as text deltas
+    while the model is still generating.
+    Early replies (greeting, profile questions, errors) are yielded whole.
+    """
+    if not user_text or not user_text.strip():
+        yield "⚠️ من صدای واضحی نشنیدم. لطفاً دوباره بگو."
+        return
+
+    early_reply, plan = await _prepare_turn(user_text, user_id)
+    if early_reply is not None:
+        yield early_reply
+        return
+
+    parts = []
+    try:
+        if plan["polite_intro"]:
+            parts.append(plan["polite_intro"] + "\n")
+            yield parts[-1]
+
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=plan["messages"],
+            temperature=0.45,
+            max_tokens=plan["max_tokens"],
+            stream=True,
         )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    except Exception as e:
+        log("❌ GPT", f"Stream error: {e}", level="error")
+        if not parts:
+            yield _error_reply(plan["is_farsi"])
+            return
+        plan["answer_cache"] = None  # never cache a cut-off answer
+
+    reply = "".join(parts).strip()
+    log("🤖 GPT Reply", reply)
+    await save_session(user_id, intent, user_text, reply)
+    _remember_answer(plan, user_text, reply)
 
 # ----------------------------------------------------
 # 🔊 Quick GPT → TTS helper
@@ -6,6 +6,8 @@ Cache.DEFAULT_CACHE = Cache.MEMORY
 cache = Cache()
 SESSION_TTL = 1800  # 30 minutes
 MAX_MEMORY_TURNS = 3  # keep last 3 user–assistant pairs
+# History entries written for bookkeeping (greeting sent, mode switch), not conversation
+BOOKKEEPING_INTENTS = {"intro", "mode"}
 
 
 async def save_session(user_id: str, intent: str, last_query: str, last_reply: str):
@@ -54,9 +56,13 @@ async def summarize_memory(user_id: str):
 
     parts = []
     for turn in session["history"]:
+        if turn.get("intent") in BOOKKEEPING_INTENTS:
+            continue
         q = turn.get("query", "")
         a = turn.get("reply", "")
         parts.append(f"User asked: {q}\nAssistant replied: {a}")
+    if not parts:
+        return ""
 
     summary = "\n\n".join(parts)
     return f"[Conversation Memory]\n{summary}"
@@ -1,91 +1,167 @@
 import os
 import asyncio
 import aiofiles
-import soundfile as sf
 import numpy as np
-import tempfile
-import subprocess
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
 
-load_dotenv()
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from utils.audio_converter import convert_for_stt, decode_to_pcm, encode_wav, resample_pcm
+from utils.audio_pool import run_audio_job
+from utils.stt_backends import get_stt_backend
+from utils.vad import speech_segments, VAD_SAMPLE_RATE
 
 # ----------------------------------------------------
 # 🎙️  Fast Whisper Transcription
 # ----------------------------------------------------
-async def transcribe_audio(audio_path: str) -> str:
+async def transcribe_wav_bytes(audio_bytes: bytes, backend=None, language: str | None = None) -> str:
     """
-    Transcribe a voice file using OpenAI Whisper (optimized).
-    - Downsamples to 12 kHz mono for faster upload
-    - Retries once if Whisper fails
+    Transcribe an STT-ready WAV (see `convert_for_stt`).
+    - Skips empty / micro clips without calling any engine
+    - `backend` overrides NIKA_STT_BACKEND for this call ("openai" / "local")
+    """
+    # Skip empty / micro clips
+    if not audio_bytes or len(audio_bytes) < 4000:
+        print("⚠️ Very short clip skipped.")
+        return ""
+
+    engine = get_stt_backend(backend)
+    text = await engine.transcribe(audio_bytes, language=language)
+    if text:
+        print(f"🗣️ Transcribed ({engine.name}): {text}")
+    return text
+
+
+async def transcribe_audio(audio_path: str, backend=None) -> str:
+    """
+    Transcribe a voice file (optimized).
+    - Decodes, trims silence (VAD) and resamples to the engine's rate in memory
     """
     if not os.path.exists(audio_path):
         print(f"⚠️ File not found: {audio_path}")
         return ""
 
+    async with aiofiles.open(audio_path, "rb") as f:
+        raw = await f.read()
+
+    engine = get_stt_backend(backend)
+
     # 🧩 Pre-process for speed
-    tmp_path = os.path.join(tempfile.gettempdir(), "nika_fast.wav")
     try:
-        # Convert to 12 kHz mono
-        cmd = [
-            "ffmpeg", "-hide_banner", "-loglevel", "error",
-            "-y", "-i", audio_path,
-            "-ac", "1", "-ar", "12000",
-            tmp_path
-        ]
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-
-        # Skip empty / micro clips
-        if os.path.getsize(tmp_path) < 4000:
-            print("⚠️ Very short clip skipped.")
-            return ""
-
-        async with aiofiles.open(tmp_path, "rb") as f:
-            audio_bytes = await f.read()
-
-        # 🧠 Whisper API (async)
-        for attempt in range(2):
-            try:
-                response = await client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=("audio.wav", audio_bytes, "audio/wav")
-                )
-                text = response.text.strip()
-                if text:
-                    print(f"🗣️ Transcribed: {text}")
-                    return text
-            except Exception as e:
-                print(f"⚠️ Whisper attempt {attempt+1} failed: {e}")
-                await asyncio.sleep(0.5)
-                continue
-
+        audio_bytes, _ = await run_audio_job(
+            convert_for_stt, raw, mime_type="", sample_rate=engine.sample_rate
+        )
+    except Exception as e:
+        print(f"⚠️ Could not decode {audio_path}: {e}")
         return ""
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+
+    return await transcribe_wav_bytes(audio_bytes, backend=engine)
 
 
 # ----------------------------------------------------
-# 🧩  Streaming version (optional)
+# 🧩  Long recordings: parallel chunks, ordered output
 # ----------------------------------------------------
-async def transcribe_in_chunks(audio_path: str, chunk_ms: int = 5000):
+LONG_AUDIO_MS = 30000      # speech longer than this goes through the chunked path
+LONG_CHUNK_MS = 25000      # Whisper works on ≤30 s windows
+CHUNK_OVERLAP_MS = 1000    # only used when one speech run must be hard-split
+STT_FANOUT = int(os.getenv("NIKA_STT_FANOUT", "4"))
+
+
+def plan_chunks(pcm: np.ndarray, sample_rate: int = VAD_SAMPLE_RATE, max_ms: int = LONG_CHUNK_MS):
     """
-    Split long recordings into ~5 s chunks and stream partial transcriptions.
+    Cut a recording into transcription chunks along VAD pauses.
+    Consecutive speech segments are packed up to `max_ms`; a single run of
+    speech longer than that is split into overlapping windows.
+    Returns [(start, end, overlaps_previous)] in sample offsets.
     """
-    data, sr = sf.read(audio_path, dtype="float32")
-    frame_len = int(sr * (chunk_ms / 1000))
-    total_frames = len(data)
-
-    for i in range(0, total_frames, frame_len):
-        segment = data[i:i+frame_len]
-        if np.mean(np.abs(segment)) < 0.01:  # skip near-silence
-            continue
-        tmp = os.path.join(tempfile.gettempdir(), f"chunk_{i}.wav")
-        sf.write(tmp, segment, sr)
-        text = await transcribe_audio(tmp)
-        if text:
-            yield text
-        os.remove(tmp)
+    segments, _ = speech_segments(pcm, sample_rate)
+    max_len = int(sample_rate * max_ms / 1000)
+    overlap = min(int(sample_rate * CHUNK_OVERLAP_MS / 1000), max_len // 4)
+
+    chunks = []
+    for start, end in segments:
+        if chunks and end - chunks[-1][0] <= max_len:
+            chunks[-1] = (chunks[-1][0], end, chunks[-1][2])
+        elif end - start <= max_len:
+            chunks.append((start, end, False))
+        else:
+            pos = start
+            while True:
+                chunks.append((pos, min(end, pos + max_len), pos != start))
+                if pos + max_len >= end:
+                    break
+                pos += max_len - overlap
+    return chunks
+
+
+def _words(text: str) -> list[str]:
+    return [w.strip(".,!?؟،;:\"'").lower() for w in text.split()]
+
+
+def merge_overlap(previous: str, text: str, max_words: int = 8) -> str:
+    """Drop the words at the start of `text` that repeat the end of `previous`."""
+    prev_words, words = _words(previous), _words(text)
+    for k in range(min(max_words, len(prev_words), len(words)), 0, -1):
+        if prev_words[-k:] == words[:k]:
+            return " ".join(text.split()[k:])
+    return text
+
+
+def _chunk_wavs(pcm: np.ndarray, chunk_ms: int, sample_rate: int):
+    """Plan the chunks and encode each one as an STT-ready WAV: [(wav_bytes, overlaps_previous)]."""
+    return [
+        (encode_wav(resample_pcm(pcm[start:end], VAD_SAMPLE_RATE, sample_rate), sample_rate), overlaps)
+        for start, end, overlaps in plan_chunks(pcm, VAD_SAMPLE_RATE, chunk_ms)
+    ]
+
+
+async def transcribe_in_chunks(
+    audio,
+    chunk_ms: int = LONG_CHUNK_MS,
+    mime_type: str = "",
+    backend=None,
+    fanout: int = STT_FANOUT,
+):
+    """
+    Stream the transcript of a long recording chunk by chunk, in order.
+    Chunks follow VAD pauses and are transcribed concurrently (at most
+    `fanout` in flight), so a 60 s note costs about one round trip.
+    `audio` is a file path, the raw uploaded bytes, or already-decoded
+    16 kHz PCM (see `decode_to_pcm`); everything stays in one in-memory
+    PCM buffer, so concurrent users never share files.
+    """
+    if isinstance(audio, str):
+        async with aiofiles.open(audio, "rb") as f:
+            audio = await f.read()
+
+    engine = get_stt_backend(backend)
+    if isinstance(audio, np.ndarray):
+        pcm = audio
+    else:
+        pcm = await run_audio_job(decode_to_pcm, audio, mime_type=mime_type, sample_rate=VAD_SAMPLE_RATE)
+    # One pool job per recording (not per chunk), so long turns can't flood the audio queue
+    chunks = await run_audio_job(_chunk_wavs, pcm, chunk_ms, engine.sample_rate)
+    limiter = asyncio.Semaphore(max(1, fanout))
+
+    async def transcribe_chunk(wav_bytes: bytes) -> str:
+        async with limiter:
+            return await transcribe_wav_bytes(wav_bytes, backend=engine)
+
+    tasks = [asyncio.create_task(transcribe_chunk(wav_bytes)) for wav_bytes, _ in chunks]
+    previous = ""
+    try:
+        for task, (_, overlaps) in zip(tasks, chunks):
+            text = await task
+            if overlaps and previous:
+                text = merge_overlap(previous, text)
+            if text:
+                previous = text
+                yield text
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def transcribe_long(audio, mime_type: str = "", backend=None, fanout: int = STT_FANOUT) -> str:
+    """Complete-text version of `transcribe_in_chunks`."""
+    parts = [
+        text async for text in transcribe_in_chunks(audio, mime_type=mime_type, backend=backend, fanout=fanout)
+    ]
+    return " ".join(parts)
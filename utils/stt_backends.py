@@ -0,0 +1,245 @@
+# utils/stt_backends.py
+"""
+Pluggable speech-to-text engines.
+
+  • openai : remote `whisper-1` (default)
+  • local  : in-process faster-whisper on CPU (int8), no network
+
+The process-wide default comes from NIKA_STT_BACKEND; every transcription
+call can override it by name. Each engine is created once per process and
+the local model stays loaded (warm) between requests.
+"""
+
+import io
+import os
+import wave
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from utils.batching import MicroBatcher
+
+load_dotenv()
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+STT_BACKEND = os.getenv("NIKA_STT_BACKEND", "openai").lower()
+LOCAL_STT_MODEL = os.getenv("NIKA_LOCAL_STT_MODEL", "small")
+LOCAL_STT_COMPUTE = os.getenv("NIKA_LOCAL_STT_COMPUTE", "int8")
+LOCAL_STT_WORKERS = int(os.getenv("NIKA_LOCAL_STT_WORKERS", "2"))
+LOCAL_STT_THREADS = int(os.getenv("NIKA_LOCAL_STT_THREADS", "0"))  # 0 = CTranslate2 default
+# Concurrent clips arriving within this window share one batched decode
+LOCAL_STT_BATCH_MS = float(os.getenv("NIKA_LOCAL_STT_BATCH_MS", "20"))
+LOCAL_STT_BATCH_SIZE = int(os.getenv("NIKA_LOCAL_STT_BATCH_SIZE", "8"))
+WHISPER_WINDOW_S = 30  # Whisper decodes fixed 30 s windows
+
+
+def wav_to_float(wav_bytes: bytes) -> np.ndarray:
+    """16-bit mono WAV bytes → float32 samples in [-1, 1]."""
+    with wave.open(io.BytesIO(wav_bytes)) as wav:
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+
+# ----------------------------------------------------
+# 🧩 Backend interface
+# ----------------------------------------------------
+class STTBackend(ABC):
+    """Transcribes an STT-ready mono WAV (see `convert_for_stt`)."""
+
+    name = "base"
+    # Rate the WAV handed to `transcribe` should be encoded at
+    sample_rate = 12000
+
+    def warmup(self):
+        """Load anything expensive up front (called at app startup)."""
+
+    @abstractmethod
+    async def transcribe(self, wav_bytes: bytes, language: str | None = None) -> str:
+        """Transcript of `wav_bytes` ("" when nothing was recognized)."""
+
+
+# ----------------------------------------------------
+# ☁️ OpenAI Whisper API
+# ----------------------------------------------------
+class OpenAIWhisperBackend(STTBackend):
+    name = "openai"
+    # Whisper only needs speech bandwidth; 12 kHz keeps uploads small
+    sample_rate = 12000
+
+    async def transcribe(self, wav_bytes: bytes, language: str | None = None) -> str:
+        """Call `whisper-1`, retrying once on failure."""
+        extra = {"language": language} if language else {}
+        for attempt in range(2):
+            try:
+                response = await client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=("audio.wav", wav_bytes, "audio/wav"),
+                    **extra,
+                )
+                text = response.text.strip()
+                if text:
+                    return text
+            except Exception as e:
+                print(f"⚠️ Whisper attempt {attempt+1} failed: {e}")
+                await asyncio.sleep(0.5)
+                continue
+        return ""
+
+
+# ----------------------------------------------------
+# 🖥️ Local faster-whisper (CPU, int8)
+# ----------------------------------------------------
+class FasterWhisperBackend(STTBackend):
+    """
+    One WhisperModel per process, loaded on first use (or at startup).
+    Concurrent requests are micro-batched (utils/batching.py): clips arriving within
+    NIKA_LOCAL_STT_BATCH_MS of each other (up to NIKA_LOCAL_STT_BATCH_SIZE)
+    are decoded together in one BatchedInferencePipeline call, one 30 s
+    Whisper window per clip, so a burst of users costs one encoder /
+    decoder pass instead of N. Clips longer than a window go through the
+    plain sequential `transcribe`.
+    """
+
+    name = "local"
+    sample_rate = 16000  # faster-whisper's native input rate
+
+    def __init__(
+        self,
+        model_size: str = LOCAL_STT_MODEL,
+        compute_type: str = LOCAL_STT_COMPUTE,
+        workers: int = LOCAL_STT_WORKERS,
+        batch_size: int = LOCAL_STT_BATCH_SIZE,
+        batch_ms: float = LOCAL_STT_BATCH_MS,
+    ):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.workers = workers
+        self._model = None
+        self._pipeline = None
+        self._lock = threading.Lock()
+        self._batcher = MicroBatcher(self._transcribe_batch, batch_size, batch_ms, name="nika-stt")
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                # Optional heavy dependency — only imported when selected
+                from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+                print(f"🧠 Loading faster-whisper '{self.model_size}' ({self.compute_type}, CPU)...")
+                self._model = WhisperModel(
+                    self.model_size,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=LOCAL_STT_THREADS,
+                    num_workers=self.workers,
+                )
+                self._pipeline = BatchedInferencePipeline(self._model)
+        return self._model
+
+    def warmup(self):
+        self._load()
+
+    def _transcribe_one(self, audio: np.ndarray, language: str | None) -> str:
+        segments, _ = self._load().transcribe(
+            audio,
+            language=language,
+            beam_size=1,
+            vad_filter=False,  # already trimmed by utils.vad
+            condition_on_previous_text=False,
+        )
+        return " ".join(seg.text.strip() for seg in segments).strip()
+
+    def _decode_windows(self, clips: list[np.ndarray], language: str | None) -> list[str]:
+        """
+        Transcribe ≤30 s clips in one batched call. Each clip is padded to
+        its own 30 s window (what Whisper does to a lone clip anyway), and
+        segments are mapped back to clips by window.
+        """
+        window = WHISPER_WINDOW_S * self.sample_rate
+        audio = np.zeros(window * len(clips), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            audio[i * window : i * window + len(clip)] = clip
+
+        segments, _ = self._pipeline.transcribe(
+            audio,
+            language=language,
+            multilingual=language is None,  # mixed Persian / English batches
+            beam_size=1,
+            batch_size=len(clips),
+            clip_timestamps=[
+                {"start": i * WHISPER_WINDOW_S, "end": (i + 1) * WHISPER_WINDOW_S} for i in range(len(clips))
+            ],
+        )
+        texts = [[] for _ in clips]
+        for seg in segments:
+            index = min(len(clips) - 1, int((seg.start + 1e-3) // WHISPER_WINDOW_S))
+            texts[index].append(seg.text.strip())
+        return [" ".join(parts).strip() for parts in texts]
+
+    def _transcribe_batch(self, items: list[tuple[np.ndarray, str | None]]) -> list:
+        """MicroBatcher callback: one result (text or exception) per item, in order."""
+        self._load()
+        results: list = [None] * len(items)
+        groups: dict = {}
+        for i, (audio, language) in enumerate(items):
+            if len(audio) > WHISPER_WINDOW_S * self.sample_rate:
+                groups.setdefault(("long", i), []).append(i)
+            else:
+                groups.setdefault(language, []).append(i)
+
+        for key, indexes in groups.items():
+            try:
+                if isinstance(key, tuple) or len(indexes) == 1:
+                    audio, language = items[indexes[0]]
+                    texts = [self._transcribe_one(audio, language)]
+                else:
+                    texts = self._decode_windows([items[i][0] for i in indexes], items[indexes[0]][1])
+                for i, text in zip(indexes, texts):
+                    results[i] = text
+            except Exception as e:
+                for i in indexes:
+                    results[i] = e
+        return results
+
+    async def transcribe(self, wav_bytes: bytes, language: str | None = None) -> str:
+        try:
+            result = await asyncio.wrap_future(self._batcher.submit((wav_to_float(wav_bytes), language)))
+            if isinstance(result, Exception):
+                raise result
+            return result
+        except Exception as e:
+            print(f"⚠️ Local transcription failed: {e}")
+            return ""
+
+
+# ----------------------------------------------------
+# 🗂️ Registry
+# ----------------------------------------------------
+BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+_instances: dict[str, STTBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def get_stt_backend(backend: "str | STTBackend | None" = None) -> STTBackend:
+    """
+    Resolve a backend by name (None → NIKA_STT_BACKEND).
+    Raises ValueError for unknown names.
+    """
+    if isinstance(backend, STTBackend):
+        return backend
+
+    name = (backend or STT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend: {name}")
+
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
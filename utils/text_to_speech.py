@@ -1,8 +1,11 @@
 import os
+import re
 import asyncio
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
+from utils.tts_cache import tts_cache
+
 # -----------------------------
 # 🔐 Environment + client setup
 # -----------------------------
@@ -10,6 +13,135 @@ load_dotenv()
 client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
+# -----------------------------
+# 🗣️ Voice selection + synthesis
+# -----------------------------
+TTS_MODEL = "gpt-4o-mini-tts"
+MAX_TTS_CHARS = 800
+
+# MIME types for the formats the speech endpoint can return
+AUDIO_MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/L16",
+}
+
+
+def pick_voice(text: str) -> str:
+    """Persian/Farsi text → 'verse', everything else → 'alloy'."""
+    is_farsi = any("\u0600" <= ch <= "\u06FF" for ch in text)
+    return "verse" if is_farsi else "alloy"
+
+
+def _tts_input(text: str) -> str:
+    if not text or not text.strip():
+        raise ValueError("Empty text input for TTS.")
+
+    # Truncate long replies
+    if len(text) > MAX_TTS_CHARS:
+        text = text[:MAX_TTS_CHARS] + " ..."
+    return text
+
+
+async def _cached_speech(key: str) -> bytes | None:
+    # Memory hits stay on the loop; only a disk lookup goes to a thread
+    cached = tts_cache.get_memory(key)
+    if cached is None:
+        cached = await asyncio.to_thread(tts_cache.get, key)
+    return cached
+
+
+async def synthesize_speech(text: str, response_format: str = "mp3") -> bytes:
+    """
+    Synthesize `text` and return the raw audio bytes.
+    Served from the TTS cache when the same clip was produced before.
+    Raises on empty input or an empty provider response.
+    """
+    text = _tts_input(text)
+    voice = pick_voice(text)
+    key = tts_cache.key(text, voice, TTS_MODEL, response_format)
+    cached = await _cached_speech(key)
+    if cached is not None:
+        return cached
+
+    response = await client.audio.speech.create(
+        model=TTS_MODEL,
+        voice=voice,
+        input=text,
+        response_format=response_format,
+    )
+
+    audio_bytes = getattr(response, "data", None)
+    if audio_bytes is None and hasattr(response, "read"):
+        audio_bytes = response.read()
+
+    if not audio_bytes:
+        raise ValueError("Empty audio response from TTS model.")
+
+    await asyncio.to_thread(tts_cache.put, key, audio_bytes)
+    return audio_bytes
+
+
+async def stream_speech(text: str, response_format: str = "mp3", chunk_size: int = 4096):
+    """
+    Yield synthesized audio bytes as the provider produces them, so
+    playback can start before synthesis finishes. Cache hits are yielded
+    as one chunk; complete fresh clips are added to the cache.
+    """
+    text = _tts_input(text)
+    voice = pick_voice(text)
+    key = tts_cache.key(text, voice, TTS_MODEL, response_format)
+    cached = await _cached_speech(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async with client.audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=voice,
+        input=text,
+        response_format=response_format,
+    ) as response:
+        async for chunk in response.iter_bytes(chunk_size):
+            parts.append(chunk)
+            yield chunk
+
+    audio_bytes = b"".join(parts)
+    if audio_bytes:
+        await asyncio.to_thread(tts_cache.put, key, audio_bytes)
+
+
+# -----------------------------
+# ✂️ Sentence splitter (for incremental TTS)
+# -----------------------------
+_SENTENCE_END = re.compile(r"(?<=[.!?؟…])\s+|\n+")
+
+
+def pop_sentences(buffer: str, min_chars: int = 20):
+    """
+    Split finished sentences off the front of a streaming text buffer.
+    Returns (sentences, remainder). Very short fragments are merged
+    with the next sentence so TTS isn't called for single words.
+    """
+    pieces = _SENTENCE_END.split(buffer)
+    remainder = pieces.pop() if pieces else ""
+
+    sentences, pending = [], ""
+    for piece in pieces:
+        pending = f"{pending} {piece}".strip() if pending else piece.strip()
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+
+    if pending:
+        remainder = f"{pending} {remainder}".strip()
+    return sentences, remainder
+
+
 # -----------------------------
 # 🔊 Async text-to-speech helper
 # -----------------------------
@@ -32,34 +164,11 @@ async def speak_reply(
             f.write(b"")
         return out_path
 
-    # Truncate long replies
-    if len(text) > 800:
-        text = text[:800] + " ..."
-
-    # 🌐 Detect Persian/Farsi text
-    is_farsi = any("\u0600" <= ch <= "\u06FF" for ch in text)
-    if is_farsi:
-        print("🌙 Detected Farsi text → using 'verse' voice.")
-        voice = "verse"
-    else:
-        voice = "alloy"
-
     try:
         # 🎤 Generate audio
-        response = await client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice=voice,
-            input=text,
-        )
+        audio_bytes = await synthesize_speech(text)
 
         # 📝 Save bytes
-        audio_bytes = getattr(response, "data", None)
-        if audio_bytes is None and hasattr(response, "read"):
-            audio_bytes = response.read()
-
-        if not audio_bytes:
-            raise ValueError("Empty audio response from TTS model.")
-
         with open(out_path, "wb") as f:
             f.write(audio_bytes)
 
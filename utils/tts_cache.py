@@ -0,0 +1,172 @@
+# utils/tts_cache.py
+"""
+Content-addressed cache for synthesized speech.
+
+Greetings, profile questions and error messages are spoken over and over;
+their audio is identical every time. Clips are keyed by
+sha256(normalized text, voice, model, format) and kept in two tiers:
+an in-memory LRU (microsecond hits) and an on-disk LRU that survives
+restarts. Both tiers are bounded by a byte budget.
+"""
+
+import os
+import hashlib
+import threading
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+
+TTS_CACHE_DIR = Path(os.getenv("NIKA_TTS_CACHE_DIR", "data/tts_cache"))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("NIKA_TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("NIKA_TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivial variants share a clip."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    def __init__(
+        self,
+        directory: Path = TTS_CACHE_DIR,
+        memory_budget: int = TTS_CACHE_MEMORY_BYTES,
+        disk_budget: int = TTS_CACHE_DISK_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key → size, oldest first
+        self._disk_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._scan_disk()
+
+    @staticmethod
+    def key(text: str, voice: str, model: str, fmt: str) -> str:
+        payload = "\x1f".join([normalize_text(text), voice, model, fmt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _scan_disk(self):
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.is_file() and not path.name.endswith(".tmp"):
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    # -----------------------------
+    # Memory tier
+    # -----------------------------
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_budget:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def get_memory(self, key: str) -> bytes | None:
+        """Memory tier only — never touches the disk, safe on the event loop."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return data
+
+    def get(self, key: str) -> bytes | None:
+        """Both tiers; a disk hit reads the file (blocking)."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            on_disk = key in self._disk
+
+        if on_disk:
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                data = None
+            with self._lock:
+                if data is not None:
+                    self._disk.move_to_end(key)
+                    self._remember(key, data)
+                    self.stats["disk_hits"] += 1
+                    return data
+                size = self._disk.pop(key, 0)
+                self._disk_bytes -= size
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """Store a clip in both tiers (disk write is atomic)."""
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+            if key in self._disk:
+                return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ TTS cache write failed: {e}")
+            return
+
+        evict = []
+        with self._lock:
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_budget and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+                evict.append(old_key)
+
+        for old_key in evict:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = lookups - self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,80 @@
+# utils/vad.py
+"""
+WebRTC voice-activity detection for recorded turns.
+
+Walkie-talkie clips start and end with dead air; trimming it before the
+STT upload saves bytes, billing and latency, and fully silent clips are
+dropped without calling the API at all.
+"""
+
+import os
+
+import numpy as np
+import webrtcvad
+
+# webrtcvad only accepts 8/16/32/48 kHz, 10/20/30 ms frames of 16-bit mono PCM
+VAD_SAMPLE_RATE = 16000
+FRAME_MS = 30
+VAD_MODE = int(os.getenv("NIKA_VAD_MODE", "2"))   # 0 = permissive … 3 = strict
+PAD_MS = 300            # audio kept around detected speech
+MAX_GAP_MS = 600        # pauses shorter than this stay inside one segment
+MIN_SPEECH_MS = 250     # less speech than this counts as a silent clip
+
+
+def _speech_flags(pcm: np.ndarray, sample_rate: int) -> list[bool]:
+    vad = webrtcvad.Vad(VAD_MODE)
+    frame_len = sample_rate * FRAME_MS // 1000
+    raw = pcm.astype(np.int16, copy=False).tobytes()
+    return [
+        vad.is_speech(raw[start * 2:(start + frame_len) * 2], sample_rate)
+        for start in range(0, len(pcm) - frame_len + 1, frame_len)
+    ]
+
+
+def speech_segments(
+    pcm: np.ndarray,
+    sample_rate: int = VAD_SAMPLE_RATE,
+    max_gap_ms: int = MAX_GAP_MS,
+    pad_ms: int = PAD_MS,
+):
+    """
+    Return (segments, speech_ms): speech regions as (start, end) sample
+    offsets — padded, with short pauses bridged — plus the total duration
+    of frames classified as speech.
+    """
+    flags = _speech_flags(pcm, sample_rate)
+    frame_len = sample_rate * FRAME_MS // 1000
+    max_gap = max(1, max_gap_ms // FRAME_MS)
+
+    runs = []
+    for i, is_speech in enumerate(flags):
+        if not is_speech:
+            continue
+        if runs and i - runs[-1][1] <= max_gap:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+
+    pad = sample_rate * pad_ms // 1000
+    segments = []
+    for start, end in runs:
+        s = max(0, start * frame_len - pad)
+        e = min(len(pcm), end * frame_len + pad)
+        if segments and s <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], e)
+        else:
+            segments.append((s, e))
+
+    return segments, sum(flags) * FRAME_MS
+
+
+def trim_silence(pcm: np.ndarray, sample_rate: int = VAD_SAMPLE_RATE):
+    """
+    Cut leading and trailing silence (pauses inside speech are kept).
+    Returns (trimmed_pcm, speech_ms); the PCM is empty when the clip holds
+    less than MIN_SPEECH_MS of speech.
+    """
+    segments, speech_ms = speech_segments(pcm, sample_rate)
+    if not segments or speech_ms < MIN_SPEECH_MS:
+        return pcm[:0], speech_ms
+    return pcm[segments[0][0]:segments[-1][1]], speech_ms